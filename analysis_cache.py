@@ -0,0 +1,115 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+ANALYSIS_CACHE_PATH = os.getenv("ANALYSIS_CACHE_PATH", "./analysis_cache.db")
+ANALYSIS_CACHE_MAX_MB = int(os.getenv("ANALYSIS_CACHE_MAX_MB", "256"))
+
+def hash_file(file_path: str, block_size: int = 1024 * 1024) -> str:
+    """Return the SHA-256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+class AnalysisCache:
+    """
+    Persistent cache of per-chunk analysis results.
+    Entries are keyed on the chunk audio hash, model name and prompt version, so
+    the same audio analyzed with the same model and prompt is never sent twice.
+    Least recently used entries are evicted once the cache exceeds max_bytes.
+    """
+
+    def __init__(self, path: str = ANALYSIS_CACHE_PATH, max_bytes: int = ANALYSIS_CACHE_MAX_MB * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS chunk_analyses (
+                audio_hash TEXT NOT NULL,
+                model_name TEXT NOT NULL,
+                prompt_version TEXT NOT NULL,
+                analysis TEXT NOT NULL,
+                size_bytes INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_accessed REAL NOT NULL,
+                PRIMARY KEY (audio_hash, model_name, prompt_version)
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_chunk_analyses_last_accessed ON chunk_analyses (last_accessed)")
+        self._conn.commit()
+
+    def get(self, audio_hash: str, model_name: str, prompt_version: str) -> Optional[Dict[str, Any]]:
+        """Return the cached analysis, or None on a miss."""
+        key = (audio_hash, model_name, prompt_version)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT analysis FROM chunk_analyses WHERE audio_hash = ? AND model_name = ? AND prompt_version = ?",
+                key
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE chunk_analyses SET last_accessed = ? WHERE audio_hash = ? AND model_name = ? AND prompt_version = ?",
+                (time.time(),) + key
+            )
+            self._conn.commit()
+        return json.loads(row[0])
+
+    def put(self, audio_hash: str, model_name: str, prompt_version: str, analysis: Dict[str, Any]):
+        """Store an analysis result and evict old entries if the cache is over its size limit."""
+        payload = json.dumps(analysis)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO chunk_analyses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (audio_hash, model_name, prompt_version, payload, len(payload), now, now)
+            )
+            self._evict()
+            self._conn.commit()
+
+    def invalidate(self, prompt_version: str = None, model_name: str = None) -> int:
+        """
+        Drop cached entries for a prompt version and/or model (everything if neither is given).
+        Returns the number of entries removed.
+        """
+        clauses, params = [], []
+        if prompt_version is not None:
+            clauses.append("prompt_version = ?")
+            params.append(prompt_version)
+        if model_name is not None:
+            clauses.append("model_name = ?")
+            params.append(model_name)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            removed = self._conn.execute(f"DELETE FROM chunk_analyses{where}", params).rowcount
+            self._conn.commit()
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries, total_bytes = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size_bytes), 0) FROM chunk_analyses"
+            ).fetchone()
+        return {"entries": entries, "size_bytes": total_bytes, "max_bytes": self.max_bytes}
+
+    def _evict(self):
+        total = self._conn.execute("SELECT COALESCE(SUM(size_bytes), 0) FROM chunk_analyses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self._conn.execute(
+            "SELECT rowid, size_bytes FROM chunk_analyses ORDER BY last_accessed"
+        ).fetchall()
+        evict = []
+        for rowid, size_bytes in rows:
+            if total <= self.max_bytes:
+                break
+            evict.append((rowid,))
+            total -= size_bytes
+        self._conn.executemany("DELETE FROM chunk_analyses WHERE rowid = ?", evict)
@@ -0,0 +1,135 @@
+import json
+import re
+from typing import Any, Dict, List, Tuple
+
+# Required fields of each item, per section of an analysis
+ANALYSIS_SECTIONS = {
+    "entities": ("name", "type"),
+    "relationships": ("source", "target"),
+    "details": ("entity", "detail"),
+}
+
+def _object_schema(properties: List[str], required: Tuple[str, ...]) -> Dict[str, Any]:
+    return {
+        "type": "object",
+        "properties": {name: {"type": "string"} for name in properties},
+        "required": list(required),
+    }
+
+# Structured-output schema for chunk analyses and refinements
+ANALYSIS_RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "entities": {"type": "array", "items": _object_schema(["name", "type", "summary"], ANALYSIS_SECTIONS["entities"])},
+        "relationships": {"type": "array", "items": _object_schema(["source", "target", "description"], ANALYSIS_SECTIONS["relationships"])},
+        "details": {"type": "array", "items": _object_schema(["entity", "detail"], ANALYSIS_SECTIONS["details"])},
+    },
+    "required": list(ANALYSIS_SECTIONS),
+}
+
+_SECTION_START = re.compile(r'"(entities|relationships|details)"\s*:\s*\[')
+_decoder = json.JSONDecoder()
+
+def strip_code_fences(text: str) -> str:
+    """Remove a surrounding markdown code block (``` or ```json) if present."""
+    text = text.strip()
+    if text.startswith('```json'):
+        text = text[7:]
+    elif text.startswith('```'):
+        text = text[3:]
+    if text.endswith('```'):
+        text = text[:-3]
+    return text.strip()
+
+def _valid_item(section: str, item: Any) -> bool:
+    return isinstance(item, dict) and all(isinstance(item.get(field), str) and item[field] for field in ANALYSIS_SECTIONS[section])
+
+def _salvage_section(text: str, pos: int, section: str) -> Tuple[List[Dict[str, Any]], bool]:
+    """
+    Decode the array items starting at pos one object at a time.
+    Returns the valid items and whether the array was read to its closing bracket
+    without skipping anything.
+    """
+    items = []
+    complete = True
+    while True:
+        while pos < len(text) and text[pos] in " \t\r\n,":
+            pos += 1
+        if pos >= len(text):
+            return items, False
+        if text[pos] == "]":
+            return items, complete
+        try:
+            item, pos = _decoder.raw_decode(text, pos)
+        except json.JSONDecodeError:
+            # Items are flat objects, so the next "{" starts the next item
+            complete = False
+            next_item = text.find("{", pos + 1)
+            next_section = _SECTION_START.search(text, pos + 1)
+            if next_item == -1 or (next_section and next_section.start() < next_item):
+                return items, False
+            pos = next_item
+            continue
+        if _valid_item(section, item):
+            items.append(item)
+        else:
+            complete = False
+
+def parse_analysis(text: str) -> Tuple[Dict[str, Any], List[str]]:
+    """
+    Parse a model response into an analysis with entities, relationships and details.
+    Well-formed JSON is parsed directly. Otherwise every complete item is recovered
+    from truncated or malformed output.
+    Returns the analysis and the sections that could not be read in full (empty when
+    the whole response parsed), so the caller can ask for just those again.
+    """
+    text = strip_code_fences(text)
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError:
+        data = None
+
+    if isinstance(data, dict):
+        analysis = {}
+        for section in ANALYSIS_SECTIONS:
+            items = data.get(section)
+            analysis[section] = [item for item in items if _valid_item(section, item)] if isinstance(items, list) else []
+        return analysis, []
+
+    analysis = {section: [] for section in ANALYSIS_SECTIONS}
+    seen = set()
+    incomplete = set()
+    for match in _SECTION_START.finditer(text):
+        section = match.group(1)
+        if section in seen:
+            continue
+        seen.add(section)
+        items, complete = _salvage_section(text, match.end(), section)
+        analysis[section] = items
+        if not complete:
+            incomplete.add(section)
+    incomplete.update(section for section in ANALYSIS_SECTIONS if section not in seen)
+    return analysis, [section for section in ANALYSIS_SECTIONS if section in incomplete]
+
+def continuation_prompt(received: Dict[str, Any], incomplete: List[str]) -> str:
+    """Follow-up instruction asking only for the items missing from a cut-off or malformed response."""
+    return (
+        "Your previous response was cut off or was not valid JSON. "
+        f"These items were received intact:\n{json.dumps(received, separators=(',', ':'))}\n"
+        f"Return ONLY the remaining {', '.join(incomplete)} that are not listed above, "
+        "as a JSON object with the same structure. Do not repeat items already received."
+    )
+
+def merge_analyses(base: Dict[str, Any], extra: Dict[str, Any]) -> Dict[str, Any]:
+    """Append extra's items to base, skipping exact duplicates."""
+    merged = {}
+    for section in ANALYSIS_SECTIONS:
+        items = list(base.get(section, []))
+        keys = {json.dumps(item, sort_keys=True) for item in items}
+        for item in extra.get(section, []):
+            key = json.dumps(item, sort_keys=True)
+            if key not in keys:
+                keys.add(key)
+                items.append(item)
+        merged[section] = items
+    return merged
@@ -1,110 +1,553 @@
 import os
+import math
+import multiprocessing
+import subprocess
 from pydub import AudioSegment
-import google.generativeai as genai
+from pydub.audio_segment import fix_wav_headers
+from pydub.exceptions import CouldntDecodeError
+from pydub.silence import detect_nonsilent
+from pydub.utils import mediainfo
 import json
-from typing import List, Dict, Any
+import hashlib
+import re
+from typing import List, Dict, Any, Optional, Iterator, Callable, Tuple, Set
 import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from analysis_cache import AnalysisCache, hash_file
+from entity_resolution import dedupe_analysis
+from llm_backend import LLMBackend, GeminiBackend
+from analysis_parser import ANALYSIS_RESPONSE_SCHEMA, ANALYSIS_SECTIONS, parse_analysis, continuation_prompt, merge_analyses
+from metrics import observe_stage, time_stage
+from llm_scheduler import LLMScheduler, llm_scheduler, estimate_tokens, PRIORITY_REFINE, PRIORITY_ANALYZE, PRIORITY_UPLOAD
+
+# Audio length assumed for a chunk when sizing a model call without a known duration
+CHUNK_DURATION_S = 5 * 60
+
+# Bump whenever the chunk analysis prompt changes so cached results are not reused
+CHUNK_PROMPT_VERSION = "chunk-v1"
+
+# Transcript-first mode: chunks are transcribed once, then entities are extracted from
+# the text. Bump the versions when the transcription or text extraction prompt changes.
+DEFAULT_TRANSCRIPT_FIRST = os.getenv("TRANSCRIPT_FIRST", "false").lower() in ("1", "true", "yes")
+TRANSCRIPT_PROMPT_VERSION = "transcript-v1"
+TEXT_PROMPT_VERSION = "text-v1"
+
+# Timestamps as the model writes them in transcripts: [mm:ss] or [h:mm:ss]
+TRANSCRIPT_TIMESTAMP = re.compile(r"\[(?:(\d{1,2}):)?(\d{1,2}):(\d{2})\]")
+
+# Extraction instructions shared by audio and transcript analysis
+EXTRACTION_INSTRUCTIONS = [
+    "For each entity, provide its canonical name and type.",
+    "For each relationship, describe the link between a source entity and a target entity.",
+    "For each key detail about an entity, describe it.",
+    "Return your findings ONLY as a JSON object with the following structure:",
+    """
+                {
+                  "entities": [
+                    {"name": "Entity Name", "type": "Person|Organization|Event|Concept|Source Material", "summary": "A brief description."}
+                  ],
+                  "relationships": [
+                    {"source": "Source Entity Name", "target": "Target Entity Name", "description": "Description of the relationship."}
+                  ],
+                  "details": [
+                    {"entity": "Entity Name", "detail": "The specific detail about this entity."}
+                  ]
+                }
+                """
+]
+
+# Follow-up requests for the missing part of a cut-off or malformed response
+ANALYSIS_MAX_CONTINUATIONS = int(os.getenv("ANALYSIS_MAX_CONTINUATIONS", "1"))
+
+# Number of chunks analyzed concurrently; each worker holds one Gemini round-trip open
+DEFAULT_ANALYSIS_WORKERS = int(os.getenv("CHUNK_ANALYSIS_WORKERS", "4"))
+
+# Number of processes encoding chunks in parallel (ffmpeg encodes are CPU-bound)
+DEFAULT_ENCODE_WORKERS = int(os.getenv("CHUNK_ENCODE_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# Number of adjacent chunk (or group) analyses merged per refinement call
+DEFAULT_REFINEMENT_FAN_IN = int(os.getenv("REFINEMENT_FAN_IN", "6"))
+
+# How chunks are encoded before upload. "speech" keeps one channel at 16 kHz, which is
+# all the model listens to anyway, and cuts upload size several times over "original".
+ENCODING_PROFILES = {
+    "original": {"format": "mp3", "suffix": ".mp3", "codec": None, "channels": None, "frame_rate": None, "bitrate": None},
+    "speech": {"format": "mp3", "suffix": ".mp3", "codec": None, "channels": 1, "frame_rate": 16000, "bitrate": "32k"},
+    "opus": {"format": "ogg", "suffix": ".ogg", "codec": "libopus", "channels": 1, "frame_rate": 16000, "bitrate": "24k"},
+}
+DEFAULT_ENCODING_PROFILE = os.getenv("CHUNK_ENCODING_PROFILE", "speech")
+
+# Optional removal of long silences before upload
+DEFAULT_TRIM_SILENCE = os.getenv("TRIM_SILENCE", "false").lower() in ("1", "true", "yes")
+SILENCE_MIN_LENGTH_MS = 1500
+SILENCE_THRESHOLD_DB = 16  # dB below the chunk's average loudness
+SILENCE_PADDING_MS = 250   # audio kept on each side of a speech segment
+
+def trim_silence(audio: AudioSegment) -> Tuple[AudioSegment, List[Dict[str, int]]]:
+    """
+    Drop long silences from an audio segment.
+    Returns the trimmed audio and a segment map of the kept ranges, each with its
+    start in the trimmed audio, its start in the original audio and its length (ms).
+    """
+    if audio.dBFS == float("-inf"):
+        return audio[:0], []
+
+    ranges = detect_nonsilent(
+        audio,
+        min_silence_len=SILENCE_MIN_LENGTH_MS,
+        silence_thresh=audio.dBFS - SILENCE_THRESHOLD_DB,
+        seek_step=10
+    )
+
+    # Ranges are at least SILENCE_MIN_LENGTH_MS apart, more than twice the padding, so padded ranges never overlap
+    trimmed = audio[:0]
+    segments = []
+    for start, end in ranges:
+        start = max(0, start - SILENCE_PADDING_MS)
+        end = min(len(audio), end + SILENCE_PADDING_MS)
+        segments.append({"trimmed_start": len(trimmed), "original_start": start, "duration": end - start})
+        trimmed += audio[start:end]
+    return trimmed, segments
+
+def remap_trimmed_time(segments: Optional[List[Dict[str, int]]], seconds: float) -> float:
+    """Map a time (seconds) in a trimmed chunk back to the same moment in the untrimmed chunk."""
+    if not segments:
+        return seconds
+    position_ms = seconds * 1000
+    for segment in reversed(segments):
+        if position_ms >= segment["trimmed_start"]:
+            offset = min(position_ms - segment["trimmed_start"], segment["duration"])
+            return (segment["original_start"] + offset) / 1000
+    return segments[0]["original_start"] / 1000
+
+def format_timestamp(seconds: float) -> str:
+    seconds = int(seconds)
+    return f"[{seconds // 3600}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}]"
+
+def offset_transcript_timestamps(transcript: str, start_time: int, segments: Optional[List[Dict[str, int]]] = None) -> str:
+    """
+    Rewrite chunk-relative [mm:ss] timestamps in a transcript as [h:mm:ss] from the
+    start of the episode, undoing silence trimming with the chunk's segment map.
+    """
+    def to_episode_time(match: re.Match) -> str:
+        hours, minutes, seconds = match.groups()
+        relative = int(hours or 0) * 3600 + int(minutes) * 60 + int(seconds)
+        return format_timestamp(start_time + remap_trimmed_time(segments, relative))
+    return TRANSCRIPT_TIMESTAMP.sub(to_episode_time, transcript)
+
+def decode_window(audio_file_path: str, start_time: int, duration_s: int,
+                  channels: Optional[int] = None, frame_rate: Optional[int] = None) -> AudioSegment:
+    """
+    Decode one window of an audio file to 16-bit PCM, optionally downmixed and resampled.
+    The seek is placed before -i so ffmpeg jumps straight to the window and reads only
+    that slice, whatever the container (pydub's start_second seeks on the output side,
+    decoding everything before the window, and reads whole WAV files into memory).
+    Returns an empty segment for a window past the end of the audio.
+    """
+    command = [
+        AudioSegment.converter, "-nostdin", "-v", "error",
+        "-ss", str(start_time), "-t", str(duration_s), "-i", audio_file_path,
+        "-vn", "-acodec", "pcm_s16le"
+    ]
+    if channels:
+        command += ["-ac", str(channels)]
+    if frame_rate:
+        command += ["-ar", str(frame_rate)]
+    command += ["-f", "wav", "-"]
+
+    result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        raise CouldntDecodeError(f"Decoding failed. ffmpeg returned error code: {result.returncode}\n\n{result.stderr.decode(errors='ignore')}")
+    if not result.stdout:
+        return AudioSegment.empty()
+    # ffmpeg can't seek back to fill in the WAV sizes when writing to a pipe
+    data = bytearray(result.stdout)
+    fix_wav_headers(data)
+    return AudioSegment(data=bytes(data))
+
+def export_chunk(audio_file_path: str, index: int, start_time: int, duration_s: int,
+                 profile_name: str = DEFAULT_ENCODING_PROFILE, trim: bool = DEFAULT_TRIM_SILENCE) -> Optional[Dict[str, Any]]:
+    """
+    Decode one chunk window of an audio file and encode it with an encoding profile.
+    Returns the chunk's index, original start/end timestamps (seconds), temporary file
+    path, silence segment map and decode/split/encode timings (seconds), or None if
+    the window holds no audio. The path is None when trimming removed the whole chunk.
+    Timings are returned rather than recorded because this runs in worker processes.
+    """
+    profile = ENCODING_PROFILES[profile_name]
+    timings = {}
+
+    # ffmpeg seeks to the window, decodes only that slice and downmixes/resamples it
+    started = time.perf_counter()
+    chunk = decode_window(audio_file_path, start_time, duration_s, profile["channels"], profile["frame_rate"])
+    timings["decode"] = time.perf_counter() - started
+    if len(chunk) == 0:
+        return None
+    end_time = start_time + int(math.ceil(len(chunk) / 1000))
+
+    started = time.perf_counter()
+    segments = None
+    if trim:
+        chunk, segments = trim_silence(chunk)
+    timings["split"] = time.perf_counter() - started
+
+    path = None
+    started = time.perf_counter()
+    if len(chunk) > 0:
+        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=profile["suffix"])
+        temp_file.close()
+        chunk.export(temp_file.name, format=profile["format"], codec=profile["codec"], bitrate=profile["bitrate"])
+        path = temp_file.name
+    timings["encode"] = time.perf_counter() - started
+
+    return {
+        "index": index,
+        "timestamp_start": start_time,
+        "timestamp_end": end_time,
+        "path": path,
+        "segments": segments,
+        "timings": timings
+    }
+
+# Encode processes shared by every episode; created on first use
+_encode_pool: Optional[ProcessPoolExecutor] = None
+_encode_pool_lock = threading.Lock()
+
+def get_encode_pool() -> ProcessPoolExecutor:
+    """
+    The process-wide chunk encode pool. Workers are started by a forkserver rather
+    than forked, since forking a process with server, job and scheduler threads
+    running can copy a held lock into the child, where it is never released.
+    """
+    global _encode_pool
+    with _encode_pool_lock:
+        if _encode_pool is None:
+            _encode_pool = ProcessPoolExecutor(
+                max_workers=max(1, DEFAULT_ENCODE_WORKERS),
+                mp_context=multiprocessing.get_context("forkserver")
+            )
+        return _encode_pool
+
+def shutdown_encode_pool():
+    global _encode_pool
+    with _encode_pool_lock:
+        if _encode_pool is not None:
+            _encode_pool.shutdown(wait=False, cancel_futures=True)
+            _encode_pool = None
+
+def _discard_chunk_file(future: Future):
+    """Done-callback removing the file of an encoded chunk that was never handed out."""
+    if future.cancelled() or future.exception() is not None:
+        return
+    chunk = future.result()
+    if chunk and chunk["path"] and os.path.exists(chunk["path"]):
+        os.unlink(chunk["path"])
 
 class AudioProcessor:
-    def __init__(self, gemini_api_key: str):
-        genai.configure(api_key=gemini_api_key)
-        self.model = genai.GenerativeModel(model_name='gemini-2.5-pro')
+    def __init__(self, gemini_api_key: Optional[str] = None, max_workers: int = DEFAULT_ANALYSIS_WORKERS, cache: Optional[AnalysisCache] = None,
+                 encoding_profile: str = DEFAULT_ENCODING_PROFILE, trim_silence: bool = DEFAULT_TRIM_SILENCE,
+                 encode_workers: int = DEFAULT_ENCODE_WORKERS, backend: Optional[LLMBackend] = None,
+                 scheduler: Optional[LLMScheduler] = None, transcript_first: bool = DEFAULT_TRANSCRIPT_FIRST):
+        """
+        Model calls go through backend; when none is given, a Gemini backend is
+        created from gemini_api_key. Calls are rate limited and retried by
+        scheduler, which defaults to the process-wide llm_scheduler.
+        With transcript_first, chunks are transcribed and entities are extracted
+        from the transcript instead of directly from the audio.
+        """
+        if encoding_profile not in ENCODING_PROFILES:
+            raise ValueError(f"Unknown encoding profile: {encoding_profile}")
+        if backend is None:
+            if not gemini_api_key:
+                raise ValueError("Either gemini_api_key or backend is required")
+            backend = GeminiBackend(gemini_api_key)
+        self.backend = backend
+        self.scheduler = scheduler if scheduler is not None else llm_scheduler
+        self.max_workers = max(1, max_workers)
+        self.cache = cache if cache is not None else AnalysisCache()
+        self.encoding_profile = encoding_profile
+        self.trim_silence = trim_silence
+        self.encode_workers = max(1, encode_workers)
+        self.transcript_first = transcript_first
         
+    def get_audio_duration(self, audio_file_path: str) -> Optional[float]:
+        """Probe the duration of an audio file in seconds without decoding it."""
+        try:
+            return float(mediainfo(audio_file_path)["duration"])
+        except (KeyError, TypeError, ValueError, OSError):
+            return None
+
+    def iter_audio_chunks(self, audio_file_path: str, chunk_duration_minutes: int = 5,
+                          skip_indices: Optional[Set[int]] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Decode and export the audio file one chunk at a time.
+        Each chunk window is decoded and encoded independently, so peak memory is
+        bounded by the chunk duration rather than the episode length. Chunks are
+        encoded with the processor's encoding profile and, if enabled, silence-trimmed.
+        With more than one encode worker, windows are encoded in the shared encode
+        pool (at most twice encode_workers in flight per call) and yielded as soon
+        as each finishes, which may be out of order.
+        Yields a dict per chunk with its index, the total chunk count (None if the
+        duration could not be probed), original start/end timestamps in seconds,
+        the temporary file path (None if the chunk was all silence) and the
+        silence segment map for remap_trimmed_time. Chunk indices in skip_indices
+        are neither decoded nor yielded.
+        The caller owns the yielded file and is responsible for removing it.
+        """
+        skip_indices = skip_indices or set()
+        chunk_duration_s = chunk_duration_minutes * 60
+        duration = self.get_audio_duration(audio_file_path)
+        total = math.ceil(duration / chunk_duration_s) if duration else None
+
+        if total is None or total == 1 or self.encode_workers == 1:
+            # Unknown length (or nothing to parallelize): encode windows in order until the audio runs out
+            index = 0
+            while total is None or index < total:
+                if index in skip_indices:
+                    index += 1
+                    continue
+                chunk = export_chunk(
+                    audio_file_path, index, index * chunk_duration_s, chunk_duration_s,
+                    self.encoding_profile, self.trim_silence
+                )
+                if chunk is None:
+                    break
+                chunk["total"] = total
+                yield chunk
+                index += 1
+            return
+
+        executor = get_encode_pool()
+        # Futures whose chunk hasn't been handed to the caller yet, finished or not
+        unclaimed = set()
+        try:
+            windows = iter([index for index in range(total) if index not in skip_indices])
+            # Keep a bounded number of windows decoding at once
+            for index in windows:
+                unclaimed.add(executor.submit(
+                    export_chunk, audio_file_path, index, index * chunk_duration_s, chunk_duration_s,
+                    self.encoding_profile, self.trim_silence
+                ))
+                if len(unclaimed) >= self.encode_workers * 2:
+                    break
+
+            while unclaimed:
+                done, _ = wait(unclaimed, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index = next(windows, None)
+                    if index is not None:
+                        unclaimed.add(executor.submit(
+                            export_chunk, audio_file_path, index, index * chunk_duration_s, chunk_duration_s,
+                            self.encoding_profile, self.trim_silence
+                        ))
+                    chunk = future.result()
+                    unclaimed.discard(future)
+                    if chunk is None:
+                        continue
+                    chunk["total"] = total
+                    yield chunk
+        finally:
+            # On error or early close, drop queued windows and remove the files of
+            # chunks encoded (now or later) but never handed to the caller
+            for future in unclaimed:
+                if not future.cancel():
+                    future.add_done_callback(_discard_chunk_file)
+
     def split_audio_into_chunks(self, audio_file_path: str, chunk_duration_minutes: int = 5) -> List[str]:
         """
         Split audio file into chunks of specified duration (default 5 minutes).
-        Returns list of temporary file paths for each chunk.
+        Returns list of temporary file paths for each chunk (silent chunks are skipped).
         """
-        audio = AudioSegment.from_file(audio_file_path)
-        chunk_duration_ms = chunk_duration_minutes * 60 * 1000  # Convert to milliseconds
-        
-        chunks = []
-        chunk_files = []
-        
-        # Split audio into chunks
-        for i in range(0, len(audio), chunk_duration_ms):
-            chunk = audio[i:i + chunk_duration_ms]
-            chunks.append(chunk)
-        
-        # Save chunks to temporary files
-        for i, chunk in enumerate(chunks):
-            temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.mp3')
-            chunk.export(temp_file.name, format="mp3")
-            chunk_files.append(temp_file.name)
-            temp_file.close()
-        
-        return chunk_files
+        chunks = sorted(self.iter_audio_chunks(audio_file_path, chunk_duration_minutes), key=lambda chunk: chunk["index"])
+        return [chunk["path"] for chunk in chunks if chunk["path"]]
     
-    def analyze_audio_chunk(self, audio_chunk_path: str) -> Dict[str, Any]:
+    def analyze_audio_chunk(self, audio_chunk_path: str, on_uploaded: Optional[Callable[[], None]] = None,
+                            audio_seconds: float = CHUNK_DURATION_S, episode_id: Optional[int] = None) -> Dict[str, Any]:
         """
-        Analyze a single audio chunk using Gemini 2.5 Pro.
+        Analyze a single audio chunk with the configured LLM backend.
         Returns structured data about entities, relationships, and details.
+        Results are served from the analysis cache when the same audio has
+        already been analyzed with the current model and prompt version.
+        on_uploaded, if given, is called once the audio has been uploaded.
+        audio_seconds sizes the call against the tokens-per-minute limit.
+        episode_id labels the stage timings recorded in metrics.
         """
         try:
-            # Upload the audio chunk to Gemini Files API
+            audio_hash = hash_file(audio_chunk_path)
+            cached = self.cache.get(audio_hash, self.backend.model_name, CHUNK_PROMPT_VERSION)
+            if cached is not None:
+                print(f"Using cached analysis for chunk {audio_chunk_path}")
+                return cached
+
+            # Upload the audio chunk so the model can listen to it
             print(f"Uploading audio chunk: {audio_chunk_path}")
-            audio_file = genai.upload_file(
-                path=audio_chunk_path,
-                display_name=os.path.basename(audio_chunk_path)
-            )
-            print(f"Completed upload: {audio_file.uri}")
+            with time_stage("upload", episode_id):
+                audio_file = self.scheduler.call(
+                    lambda: self.backend.upload_file(audio_chunk_path),
+                    priority=PRIORITY_UPLOAD,
+                    requests=0
+                )
+            if on_uploaded:
+                on_uploaded()
             
             # Construct the prompt
             prompt_parts = [
                 "You are a meticulous research analyst building a knowledge graph from a podcast.",
                 "Analyze the provided audio file. Extract all entities (people, organizations, events, concepts, source material) and the relationships between them.",
-                "For each entity, provide its canonical name and type.",
-                "For each relationship, describe the link between a source entity and a target entity.",
-                "For each key detail about an entity, describe it.",
-                "Return your findings ONLY as a JSON object with the following structure:",
-                """
-                {
-                  "entities": [
-                    {"name": "Entity Name", "type": "Person|Organization|Event|Concept|Source Material", "summary": "A brief description."}
-                  ],
-                  "relationships": [
-                    {"source": "Source Entity Name", "target": "Target Entity Name", "description": "Description of the relationship."}
-                  ],
-                  "details": [
-                    {"entity": "Entity Name", "detail": "The specific detail about this entity."}
-                  ]
-                }
-                """,
+                *EXTRACTION_INSTRUCTIONS,
                 audio_file
             ]
             
             # Generate content
             print("Generating content from audio...")
-            response = self.model.generate_content(prompt_parts)
-            
-            # Parse JSON response
-            try:
-                # Clean up the response - remove markdown code blocks if present
-                response_text = response.text.strip()
-                if response_text.startswith('```json'):
-                    # Remove ```json from start and ``` from end
-                    response_text = response_text[7:]  # Remove ```json
-                    if response_text.endswith('```'):
-                        response_text = response_text[:-3]  # Remove ```
-                elif response_text.startswith('```'):
-                    # Remove ``` from start and end
-                    response_text = response_text[3:]
-                    if response_text.endswith('```'):
-                        response_text = response_text[:-3]
-                
-                response_text = response_text.strip()
-                analysis_data = json.loads(response_text)
-                print(f"Successfully parsed JSON with {len(analysis_data.get('entities', []))} entities")
+            analysis_data, incomplete = self.generate_analysis(
+                prompt_parts, PRIORITY_ANALYZE, audio_seconds=audio_seconds, episode_id=episode_id
+            )
+            if incomplete:
+                # Keep what was salvaged, but don't cache or checkpoint a partial result
+                print(f"Chunk analysis still incomplete after retries: {', '.join(incomplete)}")
+                analysis_data["error"] = f"Incomplete response: {', '.join(incomplete)} could not be read in full"
                 return analysis_data
-            except json.JSONDecodeError as e:
-                print(f"Error decoding JSON: {e}")
-                print(f"Raw response: {response.text[:500]}...")  # Show first 500 chars
-                return {"entities": [], "relationships": [], "details": []}
-                
+
+            print(f"Successfully parsed JSON with {len(analysis_data.get('entities', []))} entities")
+            self.cache.put(audio_hash, self.backend.model_name, CHUNK_PROMPT_VERSION, analysis_data)
+            return analysis_data
+
         except Exception as e:
             print(f"Error analyzing audio chunk: {e}")
-            return {"entities": [], "relationships": [], "details": []}
+            # "error" marks the empty result as a failure so it isn't checkpointed as done
+            return {"entities": [], "relationships": [], "details": [], "error": str(e)}
     
+    def transcribe_audio_chunk(self, audio_chunk_path: str, timestamp_start: int = 0,
+                               segments: Optional[List[Dict[str, int]]] = None,
+                               on_uploaded: Optional[Callable[[], None]] = None,
+                               audio_seconds: float = CHUNK_DURATION_S, episode_id: Optional[int] = None) -> str:
+        """
+        Transcribe a single audio chunk with speaker turns and timestamps.
+        Timestamps are returned relative to the start of the episode (see
+        offset_transcript_timestamps). Transcripts are served from the analysis
+        cache when the same audio has already been transcribed.
+        Raises if the chunk could not be transcribed.
+        """
+        audio_hash = hash_file(audio_chunk_path)
+        cached = self.cache.get(audio_hash, self.backend.model_name, TRANSCRIPT_PROMPT_VERSION)
+        if cached is not None:
+            print(f"Using cached transcript for chunk {audio_chunk_path}")
+            return offset_transcript_timestamps(cached["transcript"], timestamp_start, segments)
+
+        print(f"Uploading audio chunk: {audio_chunk_path}")
+        with time_stage("upload", episode_id):
+            audio_file = self.scheduler.call(
+                lambda: self.backend.upload_file(audio_chunk_path),
+                priority=PRIORITY_UPLOAD,
+                requests=0
+            )
+        if on_uploaded:
+            on_uploaded()
+
+        prompt_parts = [
+            "Transcribe the provided podcast audio verbatim.",
+            "Start a new line for every change of speaker, beginning with a [mm:ss] timestamp from the start of this audio file, followed by the speaker's name if it is known (otherwise Speaker 1, Speaker 2, ...) and a colon.",
+            "Return ONLY the transcript as plain text.",
+            audio_file
+        ]
+        print("Transcribing audio...")
+        with time_stage("transcribe", episode_id):
+            transcript = self.scheduler.call(
+                lambda: self.backend.generate(prompt_parts),
+                priority=PRIORITY_ANALYZE,
+                tokens=estimate_tokens(sum(len(part) for part in prompt_parts[:-1]), audio_seconds)
+            ).strip()
+        if not transcript:
+            raise ValueError("Empty transcript")
+
+        self.cache.put(audio_hash, self.backend.model_name, TRANSCRIPT_PROMPT_VERSION, {"transcript": transcript})
+        return offset_transcript_timestamps(transcript, timestamp_start, segments)
+
+    def extract_from_transcript(self, transcript: str, episode_id: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Extract entities, relationships and details from a chunk transcript.
+        Results are cached on the transcript text and the text prompt version, so
+        re-extraction only pays for transcripts it hasn't seen.
+        """
+        try:
+            transcript_hash = hashlib.sha256(transcript.encode("utf-8")).hexdigest()
+            cached = self.cache.get(transcript_hash, self.backend.model_name, TEXT_PROMPT_VERSION)
+            if cached is not None:
+                return cached
+
+            prompt_parts = [
+                "You are a meticulous research analyst building a knowledge graph from a podcast.",
+                "Analyze the following timestamped podcast transcript. Extract all entities (people, organizations, events, concepts, source material) and the relationships between them.",
+                *EXTRACTION_INSTRUCTIONS,
+                f"Here is the transcript:\n{transcript}"
+            ]
+            analysis_data, incomplete = self.generate_analysis(prompt_parts, PRIORITY_ANALYZE, episode_id=episode_id)
+            if incomplete:
+                print(f"Transcript extraction still incomplete after retries: {', '.join(incomplete)}")
+                analysis_data["error"] = f"Incomplete response: {', '.join(incomplete)} could not be read in full"
+                return analysis_data
+
+            print(f"Extracted {len(analysis_data.get('entities', []))} entities from transcript")
+            self.cache.put(transcript_hash, self.backend.model_name, TEXT_PROMPT_VERSION, analysis_data)
+            return analysis_data
+        except Exception as e:
+            print(f"Error extracting from transcript: {e}")
+            return {"entities": [], "relationships": [], "details": [], "error": str(e)}
+
+    def extract_from_transcripts(self, chunks: List[Dict[str, Any]], episode_id: int,
+                                 max_workers: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Re-run extraction over stored chunk transcripts (dicts with chunk_index,
+        timestamp_start, timestamp_end and transcript) without touching the audio.
+        Returns chunk results in the same shape as process_full_audio.
+        """
+        def extract(chunk: Dict[str, Any]) -> Dict[str, Any]:
+            return {
+                "episode_id": episode_id,
+                "chunk_index": chunk["chunk_index"],
+                "timestamp_start": chunk["timestamp_start"],
+                "timestamp_end": chunk["timestamp_end"],
+                "transcript": chunk["transcript"],
+                "analysis": self.extract_from_transcript(chunk["transcript"], episode_id=episode_id)
+            }
+
+        with ThreadPoolExecutor(max_workers=max(1, max_workers or self.max_workers), thread_name_prefix="extraction") as executor:
+            results = list(executor.map(extract, chunks))
+        return sorted(results, key=lambda result: result["timestamp_start"])
+
+    def generate_analysis(self, prompt_parts: List[Any], priority: int, audio_seconds: float = 0,
+                          episode_id: Optional[int] = None, stage: str = "generate") -> Tuple[Dict[str, Any], List[str]]:
+        """
+        Request an analysis in structured-output mode and parse it.
+        If the response is cut off or malformed, every complete item is kept and the
+        model is asked (up to ANALYSIS_MAX_CONTINUATIONS times) for only the missing
+        sections. Returns the analysis and the sections still incomplete.
+        """
+        analysis = {section: [] for section in ANALYSIS_SECTIONS}
+        parts = prompt_parts
+        for attempt in range(ANALYSIS_MAX_CONTINUATIONS + 1):
+            prompt_chars = sum(len(part) for part in parts if isinstance(part, str))
+            with time_stage(stage, episode_id):
+                raw_text = self.scheduler.call(
+                    lambda: self.backend.generate(parts, response_schema=ANALYSIS_RESPONSE_SCHEMA),
+                    priority=priority,
+                    tokens=estimate_tokens(prompt_chars, audio_seconds)
+                )
+            with time_stage("json_parse", episode_id):
+                received, incomplete = parse_analysis(raw_text)
+            analysis = merge_analyses(analysis, received)
+            if not incomplete:
+                break
+            salvaged = sum(len(items) for items in received.values())
+            print(f"Response incomplete ({', '.join(incomplete)}); salvaged {salvaged} items")
+            if attempt < ANALYSIS_MAX_CONTINUATIONS:
+                parts = prompt_parts + [continuation_prompt(analysis, incomplete)]
+        return analysis, incomplete
+
     def cleanup_temp_files(self, file_paths: List[str]):
         """Clean up temporary audio chunk files."""
         for file_path in file_paths:
@@ -113,57 +556,133 @@ class AudioProcessor:
             except OSError:
                 pass
     
-    def process_full_audio(self, audio_file_path: str, episode_id: int) -> List[Dict[str, Any]]:
+    def process_full_audio(self, audio_file_path: str, episode_id: int, max_workers: Optional[int] = None,
+                           progress_callback: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+                           skip_chunks: Optional[Set[int]] = None) -> List[Dict[str, Any]]:
         """
         Process a complete audio file by splitting into chunks and analyzing each.
-        Returns list of analysis results with timing information.
+        Chunks are streamed from the encoder straight into a pool of up to
+        max_workers analysis threads (defaults to the processor's setting), so
+        uploads start as soon as the first chunk is encoded, and the encoder
+        never runs more than a couple of chunks ahead of the pool.
+        Results are always returned in timestamp order.
+        If given, progress_callback(event, data) is called (serialized) with
+        "chunk_encoded", "chunk_uploaded" and "chunk_analyzed" events as each
+        chunk moves through the pipeline; the last one carries the chunk result.
+        Chunk indices in skip_chunks (e.g. already checkpointed) are not processed
+        and are left out of the results.
+        Returns list of analysis results with timing information (and, in
+        transcript-first mode, the chunk transcript).
         """
-        chunk_files = self.split_audio_into_chunks(audio_file_path, chunk_duration_minutes=5)
-        results = []
-        
-        try:
-            for i, chunk_file in enumerate(chunk_files):
-                start_time = i * 5 * 60  # 5 minutes in seconds
-                end_time = (i + 1) * 5 * 60
-                
-                print(f"Processing chunk {i+1}/{len(chunk_files)} ({start_time}s - {end_time}s)")
-                
-                analysis = self.analyze_audio_chunk(chunk_file)
-                
-                # Add timing information
-                result = {
-                    "episode_id": episode_id,
-                    "timestamp_start": start_time,
-                    "timestamp_end": end_time,
-                    "analysis": analysis
-                }
-                results.append(result)
-                
-        finally:
-            # Clean up temporary files
-            self.cleanup_temp_files(chunk_files)
-        
-        return results
+        workers = max(1, max_workers or self.max_workers)
+        progress_lock = threading.Lock()
+        completed = [0]
 
-    def refine_full_analysis(self, all_chunk_analyses: List[Dict[str, Any]]) -> Dict[str, Any]:
-        """
-        Perform a final analysis pass over the combined JSON from all chunks.
-        This refines entities and relationships, catching links across chunks.
-        """
-        print("Starting final refinement of combined analysis...")
+        def notify(event: str, chunk: Dict[str, Any], **data):
+            if not progress_callback:
+                return
+            with progress_lock:
+                if event == "chunk_analyzed":
+                    completed[0] += 1
+                    data["completed"] = completed[0]
+                try:
+                    progress_callback(event, {"index": chunk["index"], "total": chunk["total"], **data})
+                except Exception as e:
+                    print(f"Error in progress callback: {e}")
+
+        def analyze(chunk: Dict[str, Any]) -> Dict[str, Any]:
+            start_time = chunk["timestamp_start"]
+            end_time = chunk["timestamp_end"]
+
+            print(f"Processing chunk {chunk['index']+1}/{chunk['total'] or '?'} ({start_time}s - {end_time}s)")
+
+            transcript = None
+            try:
+                if chunk["path"] and self.transcript_first:
+                    transcript = self.transcribe_audio_chunk(
+                        chunk["path"],
+                        timestamp_start=start_time,
+                        segments=chunk["segments"],
+                        on_uploaded=lambda: notify("chunk_uploaded", chunk),
+                        audio_seconds=end_time - start_time,
+                        episode_id=episode_id
+                    )
+                    analysis = self.extract_from_transcript(transcript, episode_id=episode_id)
+                elif chunk["path"]:
+                    analysis = self.analyze_audio_chunk(
+                        chunk["path"],
+                        on_uploaded=lambda: notify("chunk_uploaded", chunk),
+                        audio_seconds=end_time - start_time,
+                        episode_id=episode_id
+                    )
+                else:
+                    print(f"Chunk {chunk['index']+1} is silent, skipping analysis")
+                    analysis = {"entities": [], "relationships": [], "details": []}
+            except Exception as e:
+                print(f"Error analyzing chunk {chunk['index']+1}: {e}")
+                analysis = {"entities": [], "relationships": [], "details": [], "error": str(e)}
+            finally:
+                # Clean up the chunk file as soon as it has been analyzed
+                if chunk["path"]:
+                    self.cleanup_temp_files([chunk["path"]])
+
+            # Add timing information
+            result = {
+                "episode_id": episode_id,
+                "chunk_index": chunk["index"],
+                "timestamp_start": start_time,
+                "timestamp_end": end_time,
+                "transcript": transcript,
+                "analysis": analysis
+            }
+
+            notify("chunk_analyzed", chunk, result=result)
+            return result
 
-        # Combine all entities, relationships, and details into one structure
+        futures = []
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="chunk-analysis") as executor:
+            in_flight = set()
+            for chunk in self.iter_audio_chunks(audio_file_path, chunk_duration_minutes=5, skip_indices=skip_chunks):
+                for stage, seconds in chunk["timings"].items():
+                    observe_stage(stage, seconds, episode_id)
+                notify("chunk_encoded", chunk, timestamp_start=chunk["timestamp_start"], timestamp_end=chunk["timestamp_end"])
+                future = executor.submit(analyze, chunk)
+                futures.append(future)
+                in_flight.add(future)
+                # Backpressure: don't decode further ahead than the pool can consume
+                if len(in_flight) >= workers * 2:
+                    _, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+
+        # Chunks may finish encoding out of order; return results sorted by timestamp
+        return sorted((future.result() for future in futures), key=lambda result: result["timestamp_start"])
+
+    def combine_analyses(self, analyses: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Concatenate the entities, relationships and details of several analyses."""
         combined_json = {
             "entities": [],
             "relationships": [],
             "details": []
         }
-        for chunk in all_chunk_analyses:
-            analysis = chunk.get("analysis", {})
+        for analysis in analyses:
             if analysis:
                 combined_json["entities"].extend(analysis.get("entities", []))
                 combined_json["relationships"].extend(analysis.get("relationships", []))
                 combined_json["details"].extend(analysis.get("details", []))
+        return combined_json
+
+    def refine_combined_analysis(self, combined_json: Dict[str, Any], episode_id: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Run a single refinement call over combined analysis data.
+        Exact and near-exact duplicates are merged locally first so the model
+        only sees distinct entities, relationships and details.
+        Falls back to the (locally deduplicated) input if the call or parsing fails.
+        """
+        combined_json, report = dedupe_analysis(combined_json)
+        print(
+            f"Local dedupe removed {report['entities_removed']} entities, "
+            f"{report['relationships_removed']} relationships and {report['details_removed']} details "
+            f"({report['bytes_before']} -> {report['bytes_after']} bytes)"
+        )
 
         # Create a string representation of the combined JSON
         full_analysis_json_str = json.dumps(combined_json, indent=2)
@@ -182,20 +701,46 @@ class AudioProcessor:
         ]
 
         try:
-            response = self.model.generate_content(prompt_parts)
-
-            # Clean and parse the response
-            response_text = response.text.strip()
-            if response_text.startswith('```json'):
-                response_text = response_text[7:-3].strip()
-            elif response_text.startswith('```'):
-                response_text = response_text[3:-3].strip()
-
-            refined_data = json.loads(response_text)
+            refined_data, incomplete = self.generate_analysis(
+                prompt_parts, PRIORITY_REFINE, episode_id=episode_id, stage="refine"
+            )
+            if incomplete:
+                raise ValueError(f"Refinement response incomplete: {', '.join(incomplete)}")
             print(f"Successfully refined analysis: {len(refined_data.get('entities', []))} final entities.")
             return refined_data
 
         except Exception as e:
             print(f"Error during refinement process: {e}")
             # Return the original combined data as a fallback
-            return json.loads(full_analysis_json_str)
\ No newline at end of file
+            return json.loads(full_analysis_json_str)
+
+    def refine_full_analysis(self, all_chunk_analyses: List[Dict[str, Any]], fan_in: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Perform a final analysis pass over the combined JSON from all chunks.
+        This refines entities and relationships, catching links across chunks.
+        Episodes with more than fan_in chunks (defaults to REFINEMENT_FAN_IN) are
+        refined hierarchically: groups of fan_in adjacent chunks are refined in
+        parallel, then groups of those results, until one graph remains. Set
+        fan_in to 0 to always use a single refinement call.
+        """
+        print("Starting final refinement of combined analysis...")
+        fan_in = DEFAULT_REFINEMENT_FAN_IN if fan_in is None else fan_in
+
+        episode_id = all_chunk_analyses[0].get("episode_id") if all_chunk_analyses else None
+        level = [chunk.get("analysis", {}) for chunk in all_chunk_analyses]
+        if fan_in < 2 or len(level) <= fan_in:
+            return self.refine_combined_analysis(self.combine_analyses(level), episode_id)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="refinement") as executor:
+            depth = 0
+            while len(level) > 1:
+                depth += 1
+                groups = [level[i:i + fan_in] for i in range(0, len(level), fan_in)]
+                print(f"Refinement level {depth}: merging {len(level)} analyses into {len(groups)} groups")
+                # A group of one has nothing to merge with yet; carry it up unchanged
+                level = list(executor.map(
+                    lambda group: group[0] if len(group) == 1 else self.refine_combined_analysis(self.combine_analyses(group), episode_id),
+                    groups
+                ))
+
+        return level[0]
@@ -0,0 +1,20 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from database import Base
+from entity_resolution import entity_index
+from search_index import create_search_index
+
+@pytest.fixture
+def db():
+    """A fresh in-memory database, with the shared entity index emptied around the test."""
+    engine = create_engine("sqlite://", poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    create_search_index(engine)
+    session = sessionmaker(bind=engine)()
+    entity_index.reset()
+    yield session
+    session.close()
+    entity_index.reset()
@@ -1,6 +1,142 @@
+import json
+from collections import Counter
+from sqlalchemy import and_, insert, update, delete, select, union, text, exists
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import Session
-from database import Episode, Entity, Detail, Relationship, Source
-from typing import Dict, Any, List, Optional
+from database import Episode, Entity, EntityAlias, Detail, Relationship, Source, EpisodeGraphNode
+from typing import Dict, Any, List, Optional, Iterable, Tuple
+from graph_cache import graph_cache
+from graph_analytics import compute_graph_analytics
+from entity_resolution import EntityIndex, entity_index, entity_name_keys, looks_like_acronym, normalize_text
+from search_index import index_entities, index_details, index_episode_details, unindex_episode_details, search_entities as full_text_search
+
+# Breadth-first walk over relationships in both directions, starting at :entity_id.
+# UNION drops repeated (entity, depth) rows; on SQLite the CTE-level LIMIT also caps
+# how many rows the walk may generate so hub entities can't blow up the traversal.
+NEIGHBORHOOD_SQL = """
+WITH RECURSIVE reach(entity_id, depth) AS (
+    SELECT :entity_id, 0
+    UNION
+    SELECT CASE WHEN rel.source_entity_id = reach.entity_id THEN rel.target_entity_id ELSE rel.source_entity_id END,
+           reach.depth + 1
+    FROM reach
+    JOIN relationships AS rel
+      ON rel.source_entity_id = reach.entity_id OR rel.target_entity_id = reach.entity_id
+    WHERE reach.depth < :depth
+    {walk_limit}
+)
+SELECT entities.id, entities.name, entities.type, entities.summary, MIN(reach.depth) AS depth
+FROM reach
+JOIN entities ON entities.id = reach.entity_id
+GROUP BY entities.id
+ORDER BY depth, entities.id
+LIMIT :node_limit
+"""
+
+# Rows the recursive walk may visit per requested node
+NEIGHBORHOOD_WALK_FACTOR = 50
+
+# Keep IN (...) lists and executemany batches well under SQLite's bound-parameter limit
+BULK_BATCH_SIZE = 500
+
+def _batches(items: List[Any], size: int = BULK_BATCH_SIZE) -> Iterable[List[Any]]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+def _insert_ignoring_conflicts(db: Session, model: Any, column: str):
+    """
+    INSERT that skips rows whose unique column value is already taken, e.g. by another
+    episode storing the same new entity name at the same time. Only SQLite and
+    PostgreSQL support ON CONFLICT; elsewhere this is a plain INSERT.
+    """
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        return sqlite_insert(model).on_conflict_do_nothing(index_elements=[column])
+    if dialect == "postgresql":
+        return postgresql_insert(model).on_conflict_do_nothing(index_elements=[column])
+    return insert(model)
+
+def _name_key(name: Any) -> Optional[str]:
+    keys = entity_name_keys(name) if isinstance(name, str) else []
+    return keys[0] if keys else None
+
+def analysis_graph_delta(analysis: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Format one chunk's raw analysis as provisional graph nodes and edges.
+    Ids are derived from normalized names ("pending:<key>") so repeated mentions
+    across chunks land on the same element until the stored graph replaces them.
+    """
+    nodes, edges = {}, {}
+
+    def node_id(name: str, entity_type: str = "", summary: str = "") -> Optional[str]:
+        key = _name_key(name)
+        if key is None:
+            return None
+        element_id = f"pending:{key}"
+        if element_id not in nodes or (entity_type and not nodes[element_id]["type"]):
+            nodes[element_id] = {"id": element_id, "label": name, "type": entity_type or "", "summary": summary or ""}
+        return element_id
+
+    for entity_data in analysis.get("entities", []):
+        node_id(entity_data.get("name"), entity_data.get("type"), entity_data.get("summary"))
+    for rel_data in analysis.get("relationships", []):
+        source_id, target_id = node_id(rel_data.get("source")), node_id(rel_data.get("target"))
+        if source_id and target_id:
+            description = str(rel_data.get("description", ""))
+            edge_id = f"{source_id}|{target_id}|{normalize_text(description)}"
+            edges[edge_id] = {"id": edge_id, "source": source_id, "target": target_id, "label": description}
+
+    return {"nodes": list(nodes.values()), "edges": list(edges.values())}
+
+class ChunkAttribution:
+    """
+    Maps refined details and relationships back to the chunk sources they came from,
+    using the checkpointed per-chunk analyses of an episode.
+    """
+
+    def __init__(self, chunk_sources: List[Tuple[int, Dict[str, Any]]]):
+        self.entity_sources: Dict[str, List[int]] = {}
+        self.detail_sources: Dict[Tuple[str, str], int] = {}
+        self.pair_sources: Dict[Tuple[str, str], int] = {}
+
+        # chunk_sources is in chunk order, so setdefault keeps the earliest mention
+        for source_id, analysis in chunk_sources:
+            mentioned = set()
+            for entity_data in analysis.get("entities", []):
+                mentioned.add(_name_key(entity_data.get("name")))
+            for detail_data in analysis.get("details", []):
+                key = _name_key(detail_data.get("entity"))
+                mentioned.add(key)
+                self.detail_sources.setdefault((key, normalize_text(str(detail_data.get("detail", "")))), source_id)
+            for rel_data in analysis.get("relationships", []):
+                source_key, target_key = _name_key(rel_data.get("source")), _name_key(rel_data.get("target"))
+                mentioned.update((source_key, target_key))
+                self.pair_sources.setdefault((source_key, target_key), source_id)
+            for key in mentioned - {None}:
+                self.entity_sources.setdefault(key, []).append(source_id)
+
+    def detail_source(self, entity_name: str, detail_text: str) -> Optional[int]:
+        """The chunk with the same detail, else the first chunk mentioning the entity."""
+        key = _name_key(entity_name)
+        source_id = self.detail_sources.get((key, normalize_text(str(detail_text))))
+        if source_id is None and self.entity_sources.get(key):
+            source_id = self.entity_sources[key][0]
+        return source_id
+
+    def relationship_source(self, source_name: str, target_name: str) -> Optional[int]:
+        """The chunk relating the same pair, else the first chunk mentioning both, else either."""
+        source_key, target_key = _name_key(source_name), _name_key(target_name)
+        source_id = self.pair_sources.get((source_key, target_key)) or self.pair_sources.get((target_key, source_key))
+        if source_id is not None:
+            return source_id
+        source_chunks = self.entity_sources.get(source_key, [])
+        target_chunks = set(self.entity_sources.get(target_key, []))
+        shared = [chunk_source for chunk_source in source_chunks if chunk_source in target_chunks]
+        if shared:
+            return shared[0]
+        candidates = source_chunks or self.entity_sources.get(target_key, [])
+        return candidates[0] if candidates else None
 
 class DataService:
     def __init__(self, db: Session):
@@ -22,22 +158,50 @@ class DataService:
             self.db.commit()
     
     def get_or_create_entity(self, name: str, entity_type: str, summary: str = None) -> Entity:
-        """Get existing entity or create new one if it doesn't exist."""
-        entity = self.db.query(Entity).filter(Entity.name == name).first()
+        """
+        Get existing entity or create new one if it doesn't exist.
+        Names are linked to existing entities through the entity resolution
+        index, so "The CIA" or "CIA" resolve to "Central Intelligence Agency".
+        """
+        entity_index.sync(self.db)
+        entity_id = entity_index.lookup(name, entity_type)
+        if entity_id is None:
+            # Names the index can't link may still be taken exactly, e.g. "The" or another type's "Mercury"
+            entity_id = self.db.execute(select(Entity.id).where(Entity.name == name)).scalar()
         
-        if not entity:
-            entity = Entity(name=name, type=entity_type, summary=summary)
-            self.db.add(entity)
-            self.db.commit()
-            self.db.refresh(entity)
+        if entity_id is None:
+            # Another writer may have inserted the name since the lookup; then its row is used
+            self.db.execute(
+                _insert_ignoring_conflicts(self.db, Entity, "name").values(name=name, type=entity_type, summary=summary)
+            )
+            entity_id = self.db.execute(select(Entity.id).where(Entity.name == name)).scalar_one()
         else:
-            # Update summary if provided and current summary is empty
-            if summary and not entity.summary:
-                entity.summary = summary
-                self.db.commit()
+            self._add_alias_rows([(name, entity_id)])
+
+        entity = self.db.get(Entity, entity_id)
+        # Update summary if provided and current summary is empty
+        if summary and not entity.summary:
+            entity.summary = summary
+            self.db.flush()
+        index_entities(self.db, [entity.id])
+        self.db.commit()
+        self.db.refresh(entity)
         
+        entity_index.sync(self.db)
         return entity
     
+    def _add_alias_rows(self, links: List[Tuple[str, int]]):
+        """Record (name, entity_id) links whose matching key the index doesn't know yet."""
+        rows, seen = [], set()
+        for name, entity_id in links:
+            keys = entity_name_keys(name)
+            if not keys or keys[0] in seen or entity_index.has_key(keys[0]):
+                continue
+            seen.add(keys[0])
+            rows.append({"entity_id": entity_id, "alias": name, "alias_key": keys[0]})
+        for batch in _batches(rows):
+            self.db.execute(_insert_ignoring_conflicts(self.db, EntityAlias, "alias_key"), batch)
+    
     def create_source(self, episode_id: int, timestamp_start: int, timestamp_end: int, transcript_snippet: str = None) -> Source:
         """Create a new source record for a time segment."""
         source = Source(
@@ -59,6 +223,8 @@ class DataService:
             source_id=source_id
         )
         self.db.add(detail)
+        self.db.flush()
+        index_details(self.db, [detail.id])
         self.db.commit()
         self.db.refresh(detail)
         return detail
@@ -76,111 +242,445 @@ class DataService:
         self.db.refresh(relationship)
         return relationship
     
-    def process_refined_analysis(self, episode_id: int, refined_analysis: Dict[str, Any]):
+    def resolve_entity_ids(self, names: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Look up existing entities by name in batched queries; returns name -> {id, summary}."""
+        found = {}
+        for batch in _batches(names):
+            rows = self.db.execute(
+                select(Entity.id, Entity.name, Entity.summary).where(Entity.name.in_(batch))
+            )
+            for entity_id, name, summary in rows:
+                found[name] = {"id": entity_id, "summary": summary}
+        return found
+
+    def link_entities(self, entities: Dict[str, Dict[str, Any]]) -> Tuple[Dict[str, int], List[Dict[str, Any]]]:
+        """
+        Resolve entity names (name -> {name, type, summary}) to entity ids inside
+        the current transaction. Names are linked to existing entities through the
+        entity resolution index, names that match each other within the batch (by
+        key, acronym or fuzzy match) are inserted once, and every linked spelling
+        is recorded as an alias.
+        Returns name -> entity id and the summary backfills that were applied.
+        """
+        entity_index.sync(self.db)
+
+        linked = {}                # name -> existing entity id
+        new_entities = {}          # canonical name -> entity data for rows to insert
+        new_names = []             # canonical names of new entities, by position
+        pending = EntityIndex()    # new entities of this batch, indexed by position
+        canonical = {}             # name -> canonical name of a new entity
+
+        # Entity names are unique, so names the index can't link (no matching key, like "The"
+        # or "???", or an entity of another type under the same name) are matched exactly
+        index_ids = {name: entity_index.lookup(name, data["type"]) for name, data in entities.items()}
+        exact_ids = {}
+        for batch in _batches([name for name, entity_id in index_ids.items() if entity_id is None]):
+            exact_ids.update(self.db.execute(select(Entity.name, Entity.id).where(Entity.name.in_(batch))).all())
+
+        # Names new to the database are matched against each other the same way (key, acronym,
+        # fuzzy); acronyms go last so "CIA" can fold into a full name that follows it
+        for name in sorted(entities, key=looks_like_acronym):
+            data = entities[name]
+            entity_id = index_ids[name] or exact_ids.get(name)
+            if entity_id is not None:
+                linked[name] = entity_id
+                continue
+            position = pending.lookup(name, data["type"])
+            if position is None:
+                position = len(new_names)
+                new_names.append(name)
+                new_entities[name] = data
+            elif not new_entities[new_names[position]]["summary"] and data["summary"]:
+                new_entities[new_names[position]]["summary"] = data["summary"]
+            pending.add_entity(position, name, data["type"])
+            canonical[name] = new_names[position]
+
+        # Insert entities that don't exist yet. A name another episode inserted since the
+        # lookup is skipped, and the select below links to that episode's row instead
+        if new_entities:
+            self.db.execute(_insert_ignoring_conflicts(self.db, Entity, "name"), list(new_entities.values()))
+            inserted = self.resolve_entity_ids(list(new_entities))
+            linked.update({name: inserted[match]["id"] for name, match in canonical.items()})
+
+        # New entities' own names are indexed on sync; only other spellings need alias rows
+        new_keys = {key for name in new_entities for key in entity_name_keys(name)}
+        self._add_alias_rows([
+            (name, linked[name]) for name in entities
+            if name not in new_entities and entity_name_keys(name)[:1] and entity_name_keys(name)[0] not in new_keys
+        ])
+
+        # Fill in summaries for existing entities that don't have one
+        existing_ids = list({linked[name] for name in entities if name not in canonical})
+        summaries = {}
+        for batch in _batches(existing_ids):
+            summaries.update(self.db.execute(select(Entity.id, Entity.summary).where(Entity.id.in_(batch))).all())
+        summary_updates = {}
+        for name, data in entities.items():
+            entity_id = linked[name]
+            if entity_id in summaries and data["summary"] and not summaries[entity_id] and entity_id not in summary_updates:
+                summary_updates[entity_id] = {"id": entity_id, "summary": data["summary"]}
+        if summary_updates:
+            self.db.execute(update(Entity), list(summary_updates.values()))
+
+        return linked, list(summary_updates.values())
+
+    def save_chunk_checkpoint(self, episode_id: int, chunk_result: Dict[str, Any]) -> Source:
+        """
+        Persist one chunk's analysis (and transcript, if it has one) as a per-chunk
+        source row, replacing any earlier checkpoint.
+        """
+        source = self.db.execute(
+            select(Source).where(Source.episode_id == episode_id, Source.chunk_index == chunk_result["chunk_index"])
+        ).scalars().first()
+        if source is None:
+            source = Source(episode_id=episode_id, chunk_index=chunk_result["chunk_index"])
+            self.db.add(source)
+        source.timestamp_start = chunk_result["timestamp_start"]
+        source.timestamp_end = chunk_result["timestamp_end"]
+        source.analysis_json = json.dumps(chunk_result["analysis"])
+        if chunk_result.get("transcript"):
+            source.transcript_snippet = chunk_result["transcript"]
+        self.db.commit()
+        return source
+
+    def get_chunk_checkpoints(self, episode_id: int) -> Dict[int, Dict[str, Any]]:
+        """Get checkpointed chunk results for an episode, keyed by chunk index."""
+        rows = self.db.execute(
+            select(Source.chunk_index, Source.timestamp_start, Source.timestamp_end, Source.transcript_snippet, Source.analysis_json)
+            .where(Source.episode_id == episode_id, Source.chunk_index.isnot(None), Source.analysis_json.isnot(None))
+            .order_by(Source.chunk_index)
+        ).all()
+        return {
+            row.chunk_index: {
+                "episode_id": episode_id,
+                "chunk_index": row.chunk_index,
+                "timestamp_start": row.timestamp_start,
+                "timestamp_end": row.timestamp_end,
+                "transcript": row.transcript_snippet,
+                "analysis": json.loads(row.analysis_json)
+            }
+            for row in rows
+        }
+
+    def get_chunk_transcripts(self, episode_id: int) -> List[Dict[str, Any]]:
+        """Get the stored per-chunk transcripts of an episode in chunk order."""
+        rows = self.db.execute(
+            select(Source.chunk_index, Source.timestamp_start, Source.timestamp_end, Source.transcript_snippet)
+            .where(Source.episode_id == episode_id, Source.chunk_index.isnot(None), Source.transcript_snippet.isnot(None))
+            .order_by(Source.chunk_index)
+        ).all()
+        return [
+            {
+                "chunk_index": row.chunk_index,
+                "timestamp_start": row.timestamp_start,
+                "timestamp_end": row.timestamp_end,
+                "transcript": row.transcript_snippet
+            }
+            for row in rows
+        ]
+
+    def clear_chunk_checkpoints(self, episode_id: int):
+        """Delete checkpointed chunk sources of an episode that no stored detail or relationship uses yet."""
+        self.db.execute(
+            delete(Source).where(
+                Source.episode_id == episode_id,
+                Source.chunk_index.isnot(None),
+                ~exists().where(Detail.source_id == Source.id),
+                ~exists().where(Relationship.source_id == Source.id)
+            )
+        )
+        self.db.commit()
+
+    def set_episode_audio_path(self, episode_id: int, audio_path: Optional[str]):
+        """Remember (or forget) where an episode's uploaded audio is kept for resuming."""
+        self.db.execute(update(Episode).where(Episode.id == episode_id).values(audio_path=audio_path))
+        self.db.commit()
+
+    def process_refined_analysis(self, episode_id: int, refined_analysis: Dict[str, Any], replace: bool = False):
         """
         Process the final, refined analysis for an entire episode and store it.
+        Entities are linked through the entity resolution index and everything is written with
+        bulk inserts in a single transaction, which is rolled back on failure so
+        no partial graph is left behind.
+        Details and relationships are attributed to the checkpointed chunk source
+        they came from, so they keep real timestamps; anything that can't be traced
+        to a chunk goes to a whole-episode source (timestamps 0/0).
+        With replace=True the episode's previously stored details and relationships
+        are deleted in the same transaction (e.g. after re-extraction).
         """
         print(f"Storing refined analysis for episode {episode_id}")
 
-        # Create a single source for the entire episode's refined analysis
-        source = self.create_source(
-            episode_id=episode_id,
-            timestamp_start=0,
-            timestamp_end=0,  # Indicates full episode context
-            transcript_snippet="Refined analysis from full episode."
+        try:
+            if replace:
+                episode_sources = select(Source.id).where(Source.episode_id == episode_id)
+                unindex_episode_details(self.db, episode_id)
+                self.db.execute(delete(Detail).where(Detail.source_id.in_(episode_sources)))
+                self.db.execute(delete(Relationship).where(Relationship.source_id.in_(episode_sources)))
+                self.db.execute(delete(Source).where(Source.episode_id == episode_id, Source.chunk_index.is_(None)))
+
+            chunk_rows = self.db.execute(
+                select(Source.id, Source.analysis_json)
+                .where(Source.episode_id == episode_id, Source.chunk_index.isnot(None), Source.analysis_json.isnot(None))
+                .order_by(Source.chunk_index)
+            ).all()
+            attribution = ChunkAttribution([(row.id, json.loads(row.analysis_json)) for row in chunk_rows])
+
+            episode_source = []
+
+            def fallback_source_id() -> int:
+                # Create a single source for the entire episode's refined analysis, on first use
+                if not episode_source:
+                    source = Source(
+                        episode_id=episode_id,
+                        timestamp_start=0,
+                        timestamp_end=0,  # Indicates full episode context
+                        transcript_snippet="Refined analysis from full episode."
+                    )
+                    self.db.add(source)
+                    self.db.flush()
+                    episode_source.append(source.id)
+                return episode_source[0]
+
+            # Collapse repeated names: first type wins, first non-empty summary wins
+            entities = {}
+            for entity_data in refined_analysis.get("entities", []):
+                name = entity_data["name"]
+                if name not in entities:
+                    entities[name] = {"name": name, "type": entity_data["type"], "summary": entity_data.get("summary")}
+                elif not entities[name]["summary"] and entity_data.get("summary"):
+                    entities[name]["summary"] = entity_data["summary"]
+
+            entity_ids, summary_updates = self.link_entities(entities)
+            index_entities(self.db, entity_ids.values())
+
+            # Process details from the refined analysis
+            detail_rows = [
+                {
+                    "entity_id": entity_ids[detail_data["entity"]],
+                    "detail_text": detail_data["detail"],
+                    "source_id": attribution.detail_source(detail_data["entity"], detail_data["detail"]) or fallback_source_id()
+                }
+                for detail_data in refined_analysis.get("details", [])
+                if detail_data.get("entity") in entity_ids
+            ]
+            for batch in _batches(detail_rows):
+                self.db.execute(insert(Detail), batch)
+            index_episode_details(self.db, episode_id)
+
+            # Process relationships from the refined analysis
+            relationship_rows = [
+                {
+                    "source_entity_id": entity_ids[rel_data["source"]],
+                    "target_entity_id": entity_ids[rel_data["target"]],
+                    # Description is optional in the analysis schema
+                    "description": rel_data.get("description") or "",
+                    "source_id": attribution.relationship_source(rel_data["source"], rel_data["target"]) or fallback_source_id()
+                }
+                for rel_data in refined_analysis.get("relationships", [])
+                if rel_data.get("source") in entity_ids and rel_data.get("target") in entity_ids
+                # Two spellings of one entity would otherwise relate it to itself
+                and entity_ids[rel_data["source"]] != entity_ids[rel_data["target"]]
+            ]
+            for batch in _batches(relationship_rows):
+                self.db.execute(insert(Relationship), batch)
+
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+
+        entity_index.sync(self.db)
+
+        # Backfilled summaries show up in other episodes' graphs too
+        graph_cache.invalidate(None if summary_updates else episode_id)
+
+        print(f"Stored {len(entity_ids)} entities, {len(detail_rows)} details and {len(relationship_rows)} relationships")
+    
+    def get_episode_graph_data(self, episode_id: int, top_n: int = None) -> Dict[str, Any]:
+        """
+        Get all entities and relationships for an episode in graph format, with the
+        stored layout position, centralities and community of each node (None until
+        store_graph_analytics has run). With top_n, only the top_n nodes by betweenness
+        (then degree) are returned, with the edges between them.
+        """
+        episode_sources = select(Source.id).where(Source.episode_id == episode_id)
+
+        # Relationships for this episode, selected as plain columns
+        edge_rows = self.db.execute(
+            select(Relationship.id, Relationship.source_entity_id, Relationship.target_entity_id, Relationship.description)
+            .where(Relationship.source_id.in_(episode_sources))
+        ).all()
+
+        # Entities that have details or relationships in this episode, in one query
+        entity_ids = union(
+            select(Detail.entity_id).where(Detail.source_id.in_(episode_sources)),
+            select(Relationship.source_entity_id).where(Relationship.source_id.in_(episode_sources)),
+            select(Relationship.target_entity_id).where(Relationship.source_id.in_(episode_sources))
         )
-        
-        # Process entities from the refined analysis
-        entity_map = {}
-        for entity_data in refined_analysis.get("entities", []):
-            entity = self.get_or_create_entity(
-                name=entity_data["name"],
-                entity_type=entity_data["type"],
-                summary=entity_data.get("summary")
+        node_rows = self.db.execute(
+            select(
+                Entity.id, Entity.name, Entity.type, Entity.summary,
+                EpisodeGraphNode.x, EpisodeGraphNode.y, EpisodeGraphNode.degree_centrality,
+                EpisodeGraphNode.betweenness_centrality, EpisodeGraphNode.community
             )
-            entity_map[entity_data["name"]] = entity
-
-        # Process details from the refined analysis
-        for detail_data in refined_analysis.get("details", []):
-            entity_name = detail_data.get("entity")
-            if entity_name in entity_map:
-                self.create_detail(
-                    entity_id=entity_map[entity_name].id,
-                    detail_text=detail_data["detail"],
-                    source_id=source.id
-                )
-        
-        # Process relationships from the refined analysis
-        for rel_data in refined_analysis.get("relationships", []):
-            source_name = rel_data.get("source")
-            target_name = rel_data.get("target")
-            
-            if source_name in entity_map and target_name in entity_map:
-                self.create_relationship(
-                    source_entity_id=entity_map[source_name].id,
-                    target_entity_id=entity_map[target_name].id,
-                    description=rel_data["description"],
-                    source_id=source.id
-                )
-    
-    def get_episode_graph_data(self, episode_id: int) -> Dict[str, Any]:
-        """Get all entities and relationships for an episode in graph format."""
-        # Get all sources for this episode
-        sources = self.db.query(Source).filter(Source.episode_id == episode_id).all()
-        source_ids = [s.id for s in sources]
-        
-        if not source_ids:
-            return {"nodes": [], "edges": []}
-        
-        # Get all entities that have details or relationships in this episode
-        entities_with_details = self.db.query(Entity).join(Detail).filter(Detail.source_id.in_(source_ids)).all()
-        entities_with_relationships = self.db.query(Entity).join(Relationship, 
-            (Entity.id == Relationship.source_entity_id) | (Entity.id == Relationship.target_entity_id)
-        ).filter(Relationship.source_id.in_(source_ids)).all()
-        
-        # Combine and deduplicate entities
-        all_entities = {e.id: e for e in entities_with_details + entities_with_relationships}
-        
-        # Get all relationships for this episode
-        relationships = self.db.query(Relationship).filter(Relationship.source_id.in_(source_ids)).all()
+            .outerjoin(EpisodeGraphNode, and_(EpisodeGraphNode.entity_id == Entity.id, EpisodeGraphNode.episode_id == episode_id))
+            .where(Entity.id.in_(entity_ids))
+        ).all()
         
         # Format for frontend
-        nodes = []
-        for entity in all_entities.values():
-            nodes.append({
-                "id": str(entity.id),
-                "label": entity.name,
-                "type": entity.type,
-                "summary": entity.summary or ""
-            })
-        
-        edges = []
-        for rel in relationships:
-            edges.append({
-                "id": str(rel.id),
-                "source": str(rel.source_entity_id),
-                "target": str(rel.target_entity_id),
-                "label": rel.description
-            })
+        nodes = [
+            {
+                "id": str(row.id),
+                "label": row.name,
+                "type": row.type,
+                "summary": row.summary or "",
+                "position": {"x": row.x, "y": row.y} if row.x is not None else None,
+                "degree_centrality": row.degree_centrality,
+                "betweenness_centrality": row.betweenness_centrality,
+                "community": row.community
+            }
+            for row in node_rows
+        ]
+        edges = [
+            {"id": str(rel_id), "source": str(source_id), "target": str(target_id), "label": description}
+            for rel_id, source_id, target_id, description in edge_rows
+        ]
+
+        truncated = top_n is not None and len(nodes) > top_n
+        if truncated:
+            degree = Counter(edge["source"] for edge in edges) + Counter(edge["target"] for edge in edges)
+            nodes = sorted(
+                nodes, key=lambda node: (-(node["betweenness_centrality"] or 0.0), -degree[node["id"]], int(node["id"]))
+            )[:top_n]
+            kept = {node["id"] for node in nodes}
+            edges = [edge for edge in edges if edge["source"] in kept and edge["target"] in kept]
         
-        return {"nodes": nodes, "edges": edges}
+        return {"nodes": nodes, "edges": edges, "truncated": truncated}
+
+    def get_episode_graph_response(self, episode_id: int, top_n: int = None) -> Tuple[str, bytes]:
+        """Return (etag, serialized JSON) for an episode graph, served from the graph cache when possible."""
+        cached = graph_cache.get(episode_id, top_n)
+        if cached is not None:
+            return cached
+        # Taken before reading, so a write that commits mid-read keeps this graph out of the cache
+        generation = graph_cache.generation(episode_id)
+        return graph_cache.put(episode_id, self.get_episode_graph_data(episode_id, top_n), top_n, generation)
+
+    def store_graph_analytics(self, episode_id: int) -> int:
+        """
+        Compute and store the layout, degree and betweenness centrality and community
+        of every node in an episode's graph, replacing earlier results.
+        Returns the number of nodes stored.
+        """
+        graph = self.get_episode_graph_data(episode_id)
+        analytics = compute_graph_analytics(
+            (int(node["id"]) for node in graph["nodes"]),
+            ((int(edge["source"]), int(edge["target"])) for edge in graph["edges"])
+        )
+        rows = [{"episode_id": episode_id, "entity_id": entity_id, **values} for entity_id, values in analytics.items()]
+        try:
+            self.db.execute(delete(EpisodeGraphNode).where(EpisodeGraphNode.episode_id == episode_id))
+            for batch in _batches(rows):
+                self.db.execute(insert(EpisodeGraphNode), batch)
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+
+        graph_cache.invalidate(episode_id)
+        return len(rows)
     
-    def get_entity_details(self, entity_id: int) -> Dict[str, Any]:
-        """Get all details for a specific entity with source information."""
-        entity = self.db.query(Entity).filter(Entity.id == entity_id).first()
+    def search_entities(self, query: str, limit: int = 20) -> List[Dict[str, Any]]:
+        """Full-text search over entity names, summaries and details, best matches first."""
+        return full_text_search(self.db, query, limit)
+
+    def get_entity_neighborhood(self, entity_id: int, depth: int = 2, node_limit: int = 200, edge_limit: int = 1000) -> Dict[str, Any]:
+        """
+        Get the k-hop subgraph around an entity across all episodes.
+        Nodes are found with a recursive query in the database, nearest first,
+        and capped at node_limit; edges between them are capped at edge_limit.
+        """
+        if not self.db.execute(select(Entity.id).where(Entity.id == entity_id)).first():
+            return None
+
+        walk_limit = "LIMIT :walk_limit" if self.db.get_bind().dialect.name == "sqlite" else ""
+        node_rows = self.db.execute(
+            text(NEIGHBORHOOD_SQL.format(walk_limit=walk_limit)),
+            {
+                "entity_id": entity_id,
+                "depth": depth,
+                "node_limit": node_limit,
+                "walk_limit": node_limit * NEIGHBORHOOD_WALK_FACTOR
+            }
+        ).all()
+
+        node_ids = [row.id for row in node_rows]
+        edge_rows = self.db.execute(
+            select(
+                Relationship.id, Relationship.source_entity_id, Relationship.target_entity_id,
+                Relationship.description, Source.episode_id
+            )
+            .join(Source, Relationship.source_id == Source.id)
+            .where(Relationship.source_entity_id.in_(node_ids), Relationship.target_entity_id.in_(node_ids))
+            .order_by(Relationship.id)
+            .limit(edge_limit)
+        ).all()
+
+        nodes = [
+            {"id": str(row.id), "label": row.name, "type": row.type, "summary": row.summary or "", "depth": row.depth}
+            for row in node_rows
+        ]
+        edges = [
+            {
+                "id": str(row.id),
+                "source": str(row.source_entity_id),
+                "target": str(row.target_entity_id),
+                "label": row.description,
+                "episode_id": row.episode_id
+            }
+            for row in edge_rows
+        ]
+
+        return {
+            "nodes": nodes,
+            "edges": edges,
+            "truncated": len(node_rows) >= node_limit or len(edge_rows) >= edge_limit
+        }
+
+    def get_entity_details(self, entity_id: int, episode_id: int = None, cursor: int = None, limit: int = 100) -> Dict[str, Any]:
+        """
+        Get details for a specific entity with source information, one page at a time.
+        Details are ordered by id; pass the returned next_cursor to fetch the next
+        page (it is None on the last page). Optionally restrict to one episode.
+        """
+        entity = self.db.execute(
+            select(Entity.id, Entity.name, Entity.type, Entity.summary).where(Entity.id == entity_id)
+        ).first()
         if not entity:
             return None
         
-        details = self.db.query(Detail).filter(Detail.entity_id == entity_id).all()
-        
-        detail_list = []
-        for detail in details:
-            detail_list.append({
-                "detail": detail.detail_text,
-                "timestamp_start": detail.source.timestamp_start,
-                "timestamp_end": detail.source.timestamp_end,
-                "episode_id": detail.source.episode_id
-            })
+        # Join the source columns in the same query instead of lazy-loading detail.source per row
+        query = (
+            select(Detail.id, Detail.detail_text, Source.timestamp_start, Source.timestamp_end, Source.episode_id)
+            .join(Source, Detail.source_id == Source.id)
+            .where(Detail.entity_id == entity_id)
+        )
+        if episode_id is not None:
+            query = query.where(Source.episode_id == episode_id)
+        if cursor is not None:
+            query = query.where(Detail.id > cursor)
+        rows = self.db.execute(query.order_by(Detail.id).limit(limit + 1)).all()
+
+        next_cursor = rows[limit - 1].id if len(rows) > limit else None
+        detail_list = [
+            {
+                "detail": row.detail_text,
+                "timestamp_start": row.timestamp_start,
+                "timestamp_end": row.timestamp_end,
+                "episode_id": row.episode_id
+            }
+            for row in rows[:limit]
+        ]
         
         return {
             "entity": {
@@ -189,5 +689,6 @@ class DataService:
                 "type": entity.type,
                 "summary": entity.summary
             },
-            "details": detail_list
+            "details": detail_list,
+            "next_cursor": next_cursor
         }
\ No newline at end of file
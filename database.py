@@ -1,8 +1,14 @@
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, ForeignKey
+import os
+from sqlalchemy import create_engine, event, inspect, text, Column, Index, Integer, Float, String, Text, DateTime, ForeignKey
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from datetime import datetime
 
+from search_index import create_search_index
+
 Base = declarative_base()
 
 class Episode(Base):
@@ -12,7 +18,8 @@ class Episode(Base):
     title = Column(Text, nullable=False)
     episode_url = Column(Text)
     processed_at = Column(DateTime, default=datetime.utcnow)
-    status = Column(String(50), default='pending')  # pending, processing, complete
+    status = Column(String(50), default='pending')  # pending, queued, processing, complete, partial, failed
+    audio_path = Column(Text)  # Uploaded audio kept until processing completes, for resume
     
     # Relationships
     sources = relationship("Source", back_populates="episode")
@@ -29,14 +36,26 @@ class Entity(Base):
     details = relationship("Detail", back_populates="entity")
     source_relationships = relationship("Relationship", foreign_keys="Relationship.source_entity_id", back_populates="source_entity")
     target_relationships = relationship("Relationship", foreign_keys="Relationship.target_entity_id", back_populates="target_entity")
+    aliases = relationship("EntityAlias", back_populates="entity")
+
+class EntityAlias(Base):
+    __tablename__ = "entity_aliases"
+    
+    id = Column(Integer, primary_key=True)
+    entity_id = Column(Integer, ForeignKey("entities.id"), nullable=False, index=True)
+    alias = Column(Text, nullable=False)          # Name as it appeared in an analysis
+    alias_key = Column(Text, nullable=False, unique=True)  # Normalized matching key
+    
+    # Relationships
+    entity = relationship("Entity", back_populates="aliases")
 
 class Detail(Base):
     __tablename__ = "details"
     
     id = Column(Integer, primary_key=True)
-    entity_id = Column(Integer, ForeignKey("entities.id"), nullable=False)
+    entity_id = Column(Integer, ForeignKey("entities.id"), nullable=False, index=True)
     detail_text = Column(Text, nullable=False)
-    source_id = Column(Integer, ForeignKey("sources.id"), nullable=False)
+    source_id = Column(Integer, ForeignKey("sources.id"), nullable=False, index=True)
     
     # Relationships
     entity = relationship("Entity", back_populates="details")
@@ -46,10 +65,10 @@ class Relationship(Base):
     __tablename__ = "relationships"
     
     id = Column(Integer, primary_key=True)
-    source_entity_id = Column(Integer, ForeignKey("entities.id"), nullable=False)
-    target_entity_id = Column(Integer, ForeignKey("entities.id"), nullable=False)
+    source_entity_id = Column(Integer, ForeignKey("entities.id"), nullable=False, index=True)
+    target_entity_id = Column(Integer, ForeignKey("entities.id"), nullable=False, index=True)
     description = Column(Text, nullable=False)
-    source_id = Column(Integer, ForeignKey("sources.id"), nullable=False)
+    source_id = Column(Integer, ForeignKey("sources.id"), nullable=False, index=True)
     
     # Relationships
     source_entity = relationship("Entity", foreign_keys=[source_entity_id], back_populates="source_relationships")
@@ -60,27 +79,131 @@ class Source(Base):
     __tablename__ = "sources"
     
     id = Column(Integer, primary_key=True)
-    episode_id = Column(Integer, ForeignKey("episodes.id"), nullable=False)
+    episode_id = Column(Integer, ForeignKey("episodes.id"), nullable=False, index=True)
     timestamp_start = Column(Integer, nullable=False)  # Start time in seconds
     timestamp_end = Column(Integer, nullable=False)    # End time in seconds
     transcript_snippet = Column(Text)
+    chunk_index = Column(Integer)   # Set for per-chunk sources; NULL for whole-episode sources
+    analysis_json = Column(Text)    # Checkpointed chunk analysis, used to resume processing
+    
+    __table_args__ = (Index("ix_sources_episode_chunk", "episode_id", "chunk_index"),)
     
     # Relationships
     episode = relationship("Episode", back_populates="sources")
     details = relationship("Detail", back_populates="source")
     relationships = relationship("Relationship", back_populates="source")
 
+class EpisodeGraphNode(Base):
+    __tablename__ = "episode_graph_nodes"
+    
+    id = Column(Integer, primary_key=True)
+    episode_id = Column(Integer, ForeignKey("episodes.id"), nullable=False)
+    entity_id = Column(Integer, ForeignKey("entities.id"), nullable=False)
+    x = Column(Float, nullable=False)   # Precomputed layout position
+    y = Column(Float, nullable=False)
+    degree_centrality = Column(Float, nullable=False)
+    betweenness_centrality = Column(Float, nullable=False)
+    community = Column(Integer, nullable=False)
+    
+    __table_args__ = (Index("ix_episode_graph_nodes_episode_entity", "episode_id", "entity_id", unique=True),)
+
 # Database setup
-DATABASE_URL = "sqlite:///./podcast_mapper.db"
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./podcast_mapper.db")
+
+# Connections kept open per engine, plus extra ones opened under load
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "20"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+
+# Async drivers used by the read endpoints, by sync driver name
+ASYNC_DRIVERS = {
+    "sqlite": "aiosqlite",
+    "postgresql": "asyncpg",
+    "mysql": "aiomysql",
+}
+
+def async_database_url(url: str) -> str:
+    """The async-driver equivalent of a database URL (sqlite:/// -> sqlite+aiosqlite:///)."""
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for database URL {parsed.drivername!r}")
+    return parsed.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}").render_as_string(hide_password=False)
+
+def engine_options(url: str) -> dict:
+    """Connection arguments and pool sizing for an engine on url."""
+    parsed = make_url(url)
+    if parsed.get_backend_name() != "sqlite":
+        return {"pool_size": DB_POOL_SIZE, "max_overflow": DB_MAX_OVERFLOW, "pool_pre_ping": True}
+    options = {"connect_args": {"check_same_thread": False, "timeout": 30}}
+    if parsed.database not in (None, "", ":memory:"):
+        # In-memory databases live on a single connection and can't be pooled
+        options.update(pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW)
+        if parsed.get_driver_name() == "aiosqlite":
+            # aiosqlite defaults to NullPool, which opens a connection (and thread) per request
+            options["poolclass"] = AsyncAdaptedQueuePool
+    return options
+
+engine = create_engine(DATABASE_URL, **engine_options(DATABASE_URL))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine for the read endpoints, so queries don't block the event loop
+ASYNC_DATABASE_URL = async_database_url(DATABASE_URL)
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **engine_options(ASYNC_DATABASE_URL))
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+# SQLite connection tuning: WAL lets readers proceed while the ingest writer commits,
+# NORMAL sync is durable under WAL, and the busy timeout makes writers wait instead of failing
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -64000,       # ~64 MB page cache (negative values are KiB)
+    "mmap_size": 268435456,     # 256 MB memory-mapped I/O
+    "temp_store": "MEMORY",
+    "busy_timeout": 30000,      # milliseconds
+}
+
+@event.listens_for(engine, "connect")
+@event.listens_for(async_engine.sync_engine, "connect")
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    if engine.dialect.name != "sqlite":
+        return
+    cursor = dbapi_connection.cursor()
+    for pragma, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {pragma}={value}")
+    cursor.close()
+
+def migrate_columns():
+    """Add nullable columns missing from existing tables (create_all never alters tables)."""
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing and column.nullable:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+
+def migrate_indexes():
+    """Create any indexes missing from existing tables (create_all only indexes new tables)."""
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
 def create_tables():
     Base.metadata.create_all(bind=engine)
+    migrate_columns()
+    migrate_indexes()
+    create_search_index(engine)
 
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,343 @@
+import json
+import re
+import threading
+import unicodedata
+from collections import Counter
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from database import Entity, EntityAlias
+
+# Words ignored when deriving acronyms ("Central Intelligence Agency" -> "cia")
+ACRONYM_STOPWORDS = {"of", "the", "and", "for", "in", "on", "at", "to", "a", "an"}
+
+# Minimum trigram (Dice) similarity for a fuzzy match to link two names
+FUZZY_MATCH_THRESHOLD = 0.9
+
+# Fuzzy matching is skipped for short keys, where one character changes the meaning
+FUZZY_MIN_KEY_LENGTH = 8
+
+# Trigrams shared by more keys than this are too common to narrow candidates
+MAX_TRIGRAM_POSTINGS = 2000
+
+# Tokens that tell numbered or generational names apart ("Henry VIII", "Super Bowl LVII", "Jr.")
+NUMBERING_WORDS = {
+    "jr", "sr", "junior", "senior",
+    "first", "second", "third", "fourth", "fifth", "sixth", "seventh", "eighth", "ninth", "tenth"
+}
+
+_PARENTHETICAL = re.compile(r"^(.*?)\s*\(([^()]+)\)\s*$")
+_NON_WORD = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+_ROMAN_NUMERAL = re.compile(r"^m{0,4}(cm|cd|d?c{0,3})(xc|xl|l?x{0,3})(ix|iv|v?i{0,3})$")
+_ORDINAL = re.compile(r"^\d+(st|nd|rd|th)?$")
+
+def normalize_entity_name(name: str) -> str:
+    """
+    Fold an entity name to its matching key: strip accents, lowercase, drop
+    punctuation ("C.I.A." becomes "cia") and a leading "the", and collapse whitespace.
+    """
+    text = unicodedata.normalize("NFKD", name)
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    text = text.lower().replace("&", " and ")
+    text = _NON_WORD.sub(" ", text.replace("'", "").replace(".", ""))
+    text = _WHITESPACE.sub(" ", text).strip()
+    if text.startswith("the "):
+        text = text[4:]
+    return text
+
+def normalize_text(text: str) -> str:
+    """Fold free text (relationship descriptions, details) for duplicate detection."""
+    return _WHITESPACE.sub(" ", _NON_WORD.sub(" ", text.lower())).strip()
+
+def acronym_of(key: str) -> Optional[str]:
+    """Initials of a normalized multi-word name, or None for single words."""
+    words = [word for word in key.split() if word not in ACRONYM_STOPWORDS]
+    if len(words) < 2:
+        return None
+    return "".join(word[0] for word in words)
+
+def _spells_initials(short: str, full: str) -> bool:
+    """Whether short is the acronym of full, e.g. "CIA" and "Central Intelligence Agency"."""
+    initials = acronym_of(normalize_entity_name(full))
+    return initials is not None and acronym_letters(short) == initials
+
+def entity_name_keys(name: str) -> List[str]:
+    """
+    All keys a name should be matched under. A parenthetical is split out only
+    when one part spells the initials of the other, so "Central Intelligence
+    Agency (CIA)" matches under both parts but "Paris (Texas)" only as a whole.
+    """
+    keys = [normalize_entity_name(name)]
+    match = _PARENTHETICAL.match(name)
+    if match:
+        outer, inner = match.groups()
+        if _spells_initials(inner, outer) or _spells_initials(outer, inner):
+            keys.extend(normalize_entity_name(part) for part in (outer, inner))
+    return [key for key in dict.fromkeys(keys) if key]
+
+def numbering_tokens(key: str) -> Counter:
+    """Numeral, ordinal and jr/sr tokens of a normalized name ("henry viii" -> {"viii": 1})."""
+    return Counter(
+        word for word in key.split()
+        if word in NUMBERING_WORDS or _ORDINAL.match(word) or _ROMAN_NUMERAL.match(word)
+    )
+
+def trigrams(key: str) -> Set[str]:
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def looks_like_acronym(name: str) -> bool:
+    stripped = re.sub(r"^the\s+", "", name.strip(), flags=re.IGNORECASE)
+    letters = re.sub(r"[^A-Za-z]", "", stripped)
+    return 2 <= len(letters) <= 6 and letters.isupper() and " " not in stripped
+
+def acronym_letters(name: str) -> str:
+    """The letters of an acronym-like name, lowercased ("AT&T" -> "att", "U.S." -> "us")."""
+    stripped = re.sub(r"^the\s+", "", name.strip(), flags=re.IGNORECASE)
+    return re.sub(r"[^a-z]", "", stripped.lower())
+
+def _type_key(entity_type: Any) -> str:
+    return entity_type.strip().lower() if isinstance(entity_type, str) else ""
+
+def dedupe_analysis(combined_json: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    Merge exact and near-exact duplicates in combined chunk analyses before refinement.
+    Entities are blocked on their type and normalized name keys (case, accents,
+    punctuation and a leading "the" folded, parenthetical acronyms split out), so
+    "Apple" the organization and "apple" the concept stay apart; an entity without
+    a type joins the first entity with its name. All-caps acronyms are folded into
+    the single same-type entity whose initials they match. Relationships and details are rewritten to canonical names and
+    collapsed when their normalized text repeats.
+    Returns the deduplicated data and a report of how much was removed.
+    """
+    entities: List[Dict[str, Any]] = []
+    key_index: Dict[Tuple[str, str], int] = {}  # (name key, type) -> entity index
+    name_index: Dict[str, int] = {}              # name key -> first entity with it, of any type
+    canonical_names: Dict[str, str] = {}
+    acronyms = []
+
+    def find(keys: List[str], entity_type: str) -> Optional[int]:
+        if not entity_type:
+            return next((name_index[key] for key in keys if key in name_index), None)
+        index = next((key_index[(key, entity_type)] for key in keys if (key, entity_type) in key_index), None)
+        if index is None:
+            # An untyped entity with this name takes on the type
+            index = next((key_index[(key, "")] for key in keys if (key, "") in key_index), None)
+            if index is not None and _type_key(entities[index].get("type")):
+                index = None
+        return index
+
+    def register(keys: List[str], index: int):
+        for key in keys:
+            key_index.setdefault((key, _type_key(entities[index].get("type"))), index)
+            name_index.setdefault(key, index)
+
+    for entity_data in combined_json.get("entities", []):
+        name = entity_data.get("name")
+        if not isinstance(name, str) or not name.strip():
+            continue
+        keys = entity_name_keys(name)
+        index = find(keys, _type_key(entity_data.get("type")))
+        if index is None:
+            if looks_like_acronym(name):
+                acronyms.append(entity_data)
+                continue
+            index = len(entities)
+            entities.append(dict(entity_data))
+        else:
+            merged = entities[index]
+            if len(entity_data.get("summary") or "") > len(merged.get("summary") or ""):
+                merged["summary"] = entity_data["summary"]
+            if not merged.get("type") and entity_data.get("type"):
+                merged["type"] = entity_data["type"]
+        register(keys, index)
+        canonical_names[name] = entities[index]["name"]
+
+    # Fold acronyms into the one entity of the same type whose initials they spell
+    initials: Dict[Tuple[str, str], List[int]] = {}
+    for index, entity_data in enumerate(entities):
+        acronym = acronym_of(normalize_entity_name(entity_data["name"]))
+        if acronym:
+            initials.setdefault((acronym, _type_key(entity_data.get("type"))), []).append(index)
+    for entity_data in acronyms:
+        name = entity_data["name"]
+        keys = entity_name_keys(name)
+        candidates = initials.get((acronym_letters(name), _type_key(entity_data.get("type"))), [])
+        index = find(keys, _type_key(entity_data.get("type")))
+        if index is None and len(candidates) == 1:
+            index = candidates[0]
+            if not entities[index].get("summary") and entity_data.get("summary"):
+                entities[index]["summary"] = entity_data["summary"]
+        elif index is None:
+            index = len(entities)
+            entities.append(dict(entity_data))
+        register(keys, index)
+        canonical_names[name] = entities[index]["name"]
+
+    def resolve(name: Any) -> Any:
+        if not isinstance(name, str):
+            return name
+        if name in canonical_names:
+            return canonical_names[name]
+        index = next((name_index[key] for key in entity_name_keys(name) if key in name_index), None)
+        return entities[index]["name"] if index is not None else name
+
+    relationships, seen_relationships = [], set()
+    for rel_data in combined_json.get("relationships", []):
+        source, target = resolve(rel_data.get("source")), resolve(rel_data.get("target"))
+        signature = (source, target, normalize_text(str(rel_data.get("description", ""))))
+        if signature in seen_relationships:
+            continue
+        seen_relationships.add(signature)
+        relationships.append({**rel_data, "source": source, "target": target})
+
+    details, seen_details = [], set()
+    for detail_data in combined_json.get("details", []):
+        entity = resolve(detail_data.get("entity"))
+        signature = (entity, normalize_text(str(detail_data.get("detail", ""))))
+        if signature in seen_details:
+            continue
+        seen_details.add(signature)
+        details.append({**detail_data, "entity": entity})
+
+    deduped = {"entities": entities, "relationships": relationships, "details": details}
+    report = {
+        "entities_removed": len(combined_json.get("entities", [])) - len(entities),
+        "relationships_removed": len(combined_json.get("relationships", [])) - len(relationships),
+        "details_removed": len(combined_json.get("details", [])) - len(details),
+        "bytes_before": len(json.dumps(combined_json)),
+        "bytes_after": len(json.dumps(deduped))
+    }
+    return deduped, report
+
+class EntityIndex:
+    """
+    In-memory entity resolution index over the entities and entity_aliases tables.
+    Names are matched by normalized key first, then by acronym, then by trigram
+    similarity among candidates found through a trigram posting index, so a
+    lookup never scans the whole table. Names whose numerals, ordinals or jr/sr
+    suffixes differ never fuzzy-match. Like dedupe_analysis, a typed name only
+    links to an entity of the same type (or one stored without a type), and an
+    untyped name to the first entity with its key. sync() loads only rows added
+    since the last sync, which keeps the index current with other writers cheaply.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.key_to_entity: Dict[str, int] = {}           # key -> first entity with it, of any type
+            self.typed_keys: Dict[Tuple[str, str], int] = {}  # (key, type) -> entity
+            self.entity_types: Dict[int, str] = {}
+            self.key_trigram_counts: Dict[str, int] = {}
+            self.postings: Dict[str, Set[str]] = {}
+            self.acronyms: Dict[Tuple[str, str], Set[int]] = {}
+            self.max_entity_id = 0
+            self.max_alias_id = 0
+
+    def sync(self, db: Session):
+        """Load entities and aliases added since the last sync (everything on first use)."""
+        with self._lock:
+            entity_rows = db.execute(
+                select(Entity.id, Entity.name, Entity.type).where(Entity.id > self.max_entity_id).order_by(Entity.id)
+            ).all()
+            alias_rows = db.execute(
+                select(EntityAlias.id, EntityAlias.entity_id, EntityAlias.alias_key)
+                .where(EntityAlias.id > self.max_alias_id).order_by(EntityAlias.id)
+            ).all()
+
+            for entity_id, name, entity_type in entity_rows:
+                self._add_entity(entity_id, name, entity_type)
+                self.max_entity_id = entity_id
+
+            for alias_id, entity_id, alias_key in alias_rows:
+                self._add_key(alias_key, entity_id)
+                self.max_alias_id = alias_id
+
+    def add_entity(self, entity_id: int, name: str, entity_type: str = None):
+        """Index a name under an id directly, e.g. for entities a batch is about to insert."""
+        with self._lock:
+            self._add_entity(entity_id, name, entity_type)
+
+    def lookup(self, name: str, entity_type: str = None) -> Optional[int]:
+        """Return the id of the existing entity a name refers to, or None."""
+        keys = entity_name_keys(name)
+        if not keys:
+            return None
+        type_key = _type_key(entity_type)
+
+        with self._lock:
+            entity_id = self._exact_lookup(keys, type_key)
+            if entity_id is not None:
+                return entity_id
+
+            if type_key and looks_like_acronym(name):
+                matches = self.acronyms.get((acronym_letters(name), type_key), set())
+                if len(matches) == 1:
+                    return next(iter(matches))
+
+            return self._fuzzy_lookup(keys[0], type_key)
+
+    def has_key(self, key: str) -> bool:
+        with self._lock:
+            return key in self.key_to_entity
+
+    def _exact_lookup(self, keys: List[str], type_key: str) -> Optional[int]:
+        if not type_key:
+            return next((self.key_to_entity[key] for key in keys if key in self.key_to_entity), None)
+        # An entity stored without a type matches a name of any type
+        for candidate_type in (type_key, ""):
+            entity_id = next((self.typed_keys[(key, candidate_type)] for key in keys if (key, candidate_type) in self.typed_keys), None)
+            if entity_id is not None:
+                return entity_id
+        return None
+
+    def _add_entity(self, entity_id: int, name: str, entity_type: str = None):
+        self.entity_types.setdefault(entity_id, _type_key(entity_type))
+        for key in entity_name_keys(name):
+            self._add_key(key, entity_id)
+        acronym = acronym_of(normalize_entity_name(name))
+        if acronym:
+            self.acronyms.setdefault((acronym, self.entity_types[entity_id]), set()).add(entity_id)
+
+    def _add_key(self, key: str, entity_id: int):
+        self.typed_keys.setdefault((key, self.entity_types.get(entity_id, "")), entity_id)
+        if key in self.key_to_entity:
+            return
+        self.key_to_entity[key] = entity_id
+        grams = trigrams(key)
+        self.key_trigram_counts[key] = len(grams)
+        for gram in grams:
+            self.postings.setdefault(gram, set()).add(key)
+
+    def _fuzzy_lookup(self, key: str, type_key: str = "") -> Optional[int]:
+        if len(key) < FUZZY_MIN_KEY_LENGTH:
+            return None
+
+        grams = trigrams(key)
+        overlap = Counter()
+        for gram in grams:
+            candidates = self.postings.get(gram)
+            if candidates and len(candidates) <= MAX_TRIGRAM_POSTINGS:
+                overlap.update(candidates)
+
+        # "Henry VIII" and "Henry VII" are near-identical strings but different people
+        numbering = numbering_tokens(key)
+        best_id, best_score = None, FUZZY_MATCH_THRESHOLD
+        for candidate, shared in overlap.items():
+            score = 2 * shared / (len(grams) + self.key_trigram_counts[candidate])
+            if score < best_score or numbering_tokens(candidate) != numbering:
+                continue
+            entity_id = self.typed_keys.get((candidate, type_key)) if type_key else self.key_to_entity[candidate]
+            if entity_id is None:
+                continue
+            best_id, best_score = entity_id, score
+        return best_id
+
+# Process-wide index shared by all DataService instances
+entity_index = EntityIndex()
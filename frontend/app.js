@@ -11,6 +11,7 @@ class PodcastMapper {
     
     initializeElements() {
         this.episodeSelect = document.getElementById('episodeSelect');
+        this.nodeLimitSelect = document.getElementById('nodeLimitSelect');
         this.loadGraphBtn = document.getElementById('loadGraphBtn');
         this.uploadBtn = document.getElementById('uploadBtn');
         this.uploadModal = document.getElementById('uploadModal');
@@ -18,6 +19,7 @@ class PodcastMapper {
         this.sidebar = document.getElementById('sidebar');
         this.entityDetails = document.getElementById('entityDetails');
         this.loading = document.getElementById('loading');
+        this.jobStatus = document.getElementById('jobStatus');
     }
     
     setupEventListeners() {
@@ -66,7 +68,10 @@ class PodcastMapper {
         this.showLoading(true);
         
         try {
-            const response = await fetch(`${this.apiBase}/episodes/${episodeId}/graph`);
+            // Optionally fetch only the most central nodes of large graphs
+            const top = this.nodeLimitSelect.value;
+            const query = top ? `?top=${top}` : '';
+            const response = await fetch(`${this.apiBase}/episodes/${episodeId}/graph${query}`);
             const graphData = await response.json();
             
             this.renderGraph(graphData);
@@ -79,6 +84,10 @@ class PodcastMapper {
     }
     
     renderGraph(data) {
+        // Completed episodes come with a layout computed on the server; use it as-is
+        const precomputed = data.nodes.length > 0 && data.nodes.every(node => node.position);
+        const maxBetweenness = Math.max(0, ...data.nodes.map(node => node.betweenness_centrality || 0));
+        
         // Initialize Cytoscape
         this.cy = cytoscape({
             container: document.getElementById('cy'),
@@ -90,8 +99,11 @@ class PodcastMapper {
                         id: node.id,
                         label: node.label,
                         type: node.type,
-                        summary: node.summary
-                    }
+                        summary: node.summary,
+                        betweenness: node.betweenness_centrality || 0,
+                        community: node.community
+                    },
+                    position: node.position ? { ...node.position } : undefined
                 })),
                 // Edges
                 ...data.edges.map(edge => ({
@@ -116,8 +128,9 @@ class PodcastMapper {
                         'text-outline-width': 2,
                         'text-outline-color': '#000',
                         'font-size': '12px',
-                        'width': 60,
-                        'height': 60
+                        // Central nodes are drawn larger
+                        'width': (ele) => this.nodeSize(ele.data('betweenness'), maxBetweenness),
+                        'height': (ele) => this.nodeSize(ele.data('betweenness'), maxBetweenness)
                     }
                 },
                 {
@@ -154,23 +167,7 @@ class PodcastMapper {
                 }
             ],
             
-            layout: {
-                name: 'dagre',
-                padding: 30,
-                spacingFactor: 1.75,
-                fit: true,
-                padding: 30,
-                randomize: false,
-                componentSpacing: 100,
-                nodeRepulsion: 400000,
-                edgeElasticity: 100,
-                nestingFactor: 5,
-                gravity: 80,
-                numIter: 1000,
-                initialTemp: 200,
-                coolingFactor: 0.95,
-                minTemp: 1.0
-            }
+            layout: precomputed ? { name: 'preset', fit: true, padding: 30 } : this.layoutOptions()
         });
         
         // Add click event for nodes
@@ -190,6 +187,50 @@ class PodcastMapper {
         });
     }
     
+    nodeSize(betweenness, maxBetweenness) {
+        return maxBetweenness > 0 ? 45 + 45 * Math.sqrt((betweenness || 0) / maxBetweenness) : 60;
+    }
+    
+    layoutOptions() {
+        return {
+            name: 'dagre',
+            padding: 30,
+            spacingFactor: 1.75,
+            fit: true,
+            padding: 30,
+            randomize: false,
+            componentSpacing: 100,
+            nodeRepulsion: 400000,
+            edgeElasticity: 100,
+            nestingFactor: 5,
+            gravity: 80,
+            numIter: 1000,
+            initialTemp: 200,
+            coolingFactor: 0.95,
+            minTemp: 1.0
+        };
+    }
+    
+    applyGraphDelta(delta) {
+        // Add provisional nodes/edges from a freshly analyzed chunk to the live graph
+        const elements = [];
+        delta.nodes.forEach(node => {
+            if (this.cy.getElementById(node.id).empty()) {
+                elements.push({ data: { ...node } });
+            }
+        });
+        delta.edges.forEach(edge => {
+            if (this.cy.getElementById(edge.id).empty()) {
+                elements.push({ data: { ...edge } });
+            }
+        });
+        
+        if (elements.length > 0) {
+            this.cy.add(elements);
+            this.cy.layout(this.layoutOptions()).run();
+        }
+    }
+    
     getNodeColor(type) {
         const colors = {
             'Person': '#e74c3c',
@@ -219,27 +260,49 @@ class PodcastMapper {
             
             if (details.length > 0) {
                 html += '<div class="details-section"><h4>Details:</h4>';
-                details.forEach(detail => {
-                    const timestamp = this.formatTimestamp(detail.timestamp_start);
-                    html += `
-                        <div class="detail-item">
-                            <div class="detail-text">${detail.detail}</div>
-                            <div class="detail-timestamp" onclick="app.jumpToTimestamp(${detail.timestamp_start})">
-                                ${timestamp}
-                            </div>
-                        </div>
-                    `;
-                });
+                html += `<div id="detailList">${this.renderDetailItems(details)}</div>`;
+                html += '<button id="loadMoreDetails" class="hidden">Load more</button>';
                 html += '</div>';
             }
             
             this.entityDetails.innerHTML = html;
+            this.setupLoadMoreDetails(entity.id, entityData.next_cursor);
         } catch (error) {
             console.error('Error loading entity details:', error);
             this.entityDetails.innerHTML = '<p>Error loading entity details</p>';
         }
     }
     
+    renderDetailItems(details) {
+        return details.map(detail => `
+            <div class="detail-item">
+                <div class="detail-text">${detail.detail}</div>
+                <div class="detail-timestamp" onclick="app.jumpToTimestamp(${detail.timestamp_start})">
+                    ${this.formatTimestamp(detail.timestamp_start)}
+                </div>
+            </div>
+        `).join('');
+    }
+    
+    setupLoadMoreDetails(entityId, cursor) {
+        const button = document.getElementById('loadMoreDetails');
+        if (!button) return;
+        
+        let nextCursor = cursor;
+        button.classList.toggle('hidden', nextCursor === null);
+        button.onclick = async () => {
+            try {
+                const response = await fetch(`${this.apiBase}/entities/${entityId}/details?cursor=${nextCursor}`);
+                const page = await response.json();
+                document.getElementById('detailList').insertAdjacentHTML('beforeend', this.renderDetailItems(page.details));
+                nextCursor = page.next_cursor;
+                button.classList.toggle('hidden', nextCursor === null);
+            } catch (error) {
+                console.error('Error loading more details:', error);
+            }
+        };
+    }
+    
     formatTimestamp(seconds) {
         const minutes = Math.floor(seconds / 60);
         const remainingSeconds = seconds % 60;
@@ -295,9 +358,9 @@ class PodcastMapper {
             
             // Show progress
             document.getElementById('uploadProgress').classList.remove('hidden');
-            document.getElementById('progressText').textContent = 'Processing audio...';
+            document.getElementById('progressText').textContent = 'Uploading audio...';
             
-            // Upload and process the audio file
+            // Upload the audio file; processing runs in the background
             const audioFormData = new FormData();
             audioFormData.append('audio_file', audioFile);
             
@@ -306,22 +369,111 @@ class PodcastMapper {
                 body: audioFormData
             });
             
-            if (processResponse.ok) {
-                const result = await processResponse.json();
-                alert(`Successfully processed ${result.chunks_processed} audio chunks!`);
-                this.hideUploadModal();
-                this.loadEpisodes(); // Refresh episode list
-            } else {
+            if (!processResponse.ok) {
                 const error = await processResponse.json();
                 throw new Error(error.detail || 'Upload failed');
             }
             
+            const job = await processResponse.json();
+            this.hideUploadModal();
+            await this.loadEpisodes(); // Show the queued episode
+            
+            // Show the episode's graph growing as chunks are analyzed
+            this.episodeSelect.value = episodeId;
+            this.currentEpisodeId = String(episodeId);
+            this.renderGraph({ nodes: [], edges: [] });
+            
+            const result = window.EventSource
+                ? await this.followJob(job.job_id, String(episodeId))
+                : await this.waitForJob(job.job_id);
+            alert(`Successfully processed ${result.chunks_processed} audio chunks!`);
+            this.loadEpisodes(); // Refresh episode list
+            if (this.currentEpisodeId === String(episodeId)) {
+                this.loadGraph(); // Replace the provisional graph with the stored one
+            }
+            
         } catch (error) {
             console.error('Upload error:', error);
             alert(`Upload failed: ${error.message}`);
         }
     }
     
+    followJob(jobId, episodeId) {
+        // Stream job progress and partial graph updates over Server-Sent Events
+        return new Promise((resolve, reject) => {
+            const source = new EventSource(`${this.apiBase}/jobs/${jobId}/events`);
+            this.showJobStatus('Waiting in queue...');
+            
+            source.addEventListener('progress', (e) => {
+                const job = JSON.parse(e.data);
+                let text = `Processing (${job.stage})...`;
+                if (job.chunks_total) {
+                    text += ` ${job.chunks_completed}/${job.chunks_total} chunks analyzed`;
+                }
+                this.showJobStatus(text);
+            });
+            
+            source.addEventListener('graph_delta', (e) => {
+                // Only draw deltas while the user is still looking at this episode
+                if (this.cy && this.currentEpisodeId === episodeId) {
+                    this.applyGraphDelta(JSON.parse(e.data));
+                }
+            });
+            
+            source.addEventListener('complete', (e) => {
+                source.close();
+                this.showJobStatus(null);
+                resolve(JSON.parse(e.data).result);
+            });
+            
+            source.addEventListener('failed', (e) => {
+                source.close();
+                this.showJobStatus(null);
+                reject(new Error(JSON.parse(e.data).error || 'Processing failed'));
+            });
+            
+            source.onerror = () => {
+                // The browser reconnects on its own unless the stream was refused
+                if (source.readyState === EventSource.CLOSED) {
+                    this.showJobStatus(null);
+                    reject(new Error('Lost connection to job progress stream'));
+                }
+            };
+        });
+    }
+    
+    showJobStatus(text) {
+        this.jobStatus.textContent = text || '';
+        this.jobStatus.classList.toggle('hidden', !text);
+    }
+    
+    async waitForJob(jobId, intervalMs = 3000) {
+        const progressText = document.getElementById('progressText');
+        
+        while (true) {
+            const response = await fetch(`${this.apiBase}/jobs/${jobId}`);
+            if (!response.ok) {
+                throw new Error('Lost track of processing job');
+            }
+            
+            const job = await response.json();
+            if (job.status === 'complete') {
+                return job.result;
+            }
+            if (job.status === 'failed') {
+                throw new Error(job.error || 'Processing failed');
+            }
+            
+            let text = job.status === 'queued' ? 'Waiting in queue...' : `Processing audio (${job.stage})...`;
+            if (job.chunks_total) {
+                text += ` ${job.chunks_completed}/${job.chunks_total} chunks analyzed`;
+            }
+            progressText.textContent = text;
+            
+            await new Promise(resolve => setTimeout(resolve, intervalMs));
+        }
+    }
+    
     showLoading(show) {
         if (show) {
             this.loading.classList.remove('hidden');
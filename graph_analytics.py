@@ -0,0 +1,250 @@
+import math
+import random
+from collections import deque
+from typing import Any, Dict, Iterable, List, Set, Tuple
+
+# Above this many nodes, betweenness is estimated from a fixed sample of source nodes
+BETWEENNESS_MAX_SOURCES = 500
+
+# Force-directed layout: ideal edge length in pixels and number of cooling steps
+LAYOUT_NODE_SPACING = 150.0
+LAYOUT_ITERATIONS = 100
+# Graphs above this many nodes get proportionally fewer steps, keeping layout time bounded
+LAYOUT_FULL_ITERATION_NODES = 500
+LAYOUT_MIN_ITERATIONS = 25
+
+# Fixed seed so re-running analytics on the same graph gives the same picture
+ANALYTICS_SEED = 42
+
+# Golden angle, for spreading points evenly on a spiral
+_GOLDEN_ANGLE = math.pi * (3 - math.sqrt(5))
+
+def build_adjacency(node_ids: Iterable[int], edges: Iterable[Tuple[int, int]]) -> Dict[int, Set[int]]:
+    """Undirected simple graph over node_ids; self-loops, repeated edges and edges to unknown nodes are dropped."""
+    adjacency = {node: set() for node in node_ids}
+    for source, target in edges:
+        if source != target and source in adjacency and target in adjacency:
+            adjacency[source].add(target)
+            adjacency[target].add(source)
+    return adjacency
+
+def degree_centrality(adjacency: Dict[int, Set[int]]) -> Dict[int, float]:
+    """Share of the other nodes each node is connected to."""
+    scale = 1.0 / (len(adjacency) - 1) if len(adjacency) > 1 else 0.0
+    return {node: len(neighbors) * scale for node, neighbors in adjacency.items()}
+
+def betweenness_centrality(adjacency: Dict[int, Set[int]], max_sources: int = BETWEENNESS_MAX_SOURCES,
+                           seed: int = ANALYTICS_SEED) -> Dict[int, float]:
+    """
+    Normalized betweenness (Brandes' algorithm on the unweighted graph): the share of
+    shortest paths between other nodes that pass through each node. Graphs with more
+    than max_sources nodes are estimated from a sample of source nodes.
+    """
+    nodes = sorted(adjacency)
+    count = len(nodes)
+    betweenness = dict.fromkeys(nodes, 0.0)
+    if count < 3:
+        return betweenness
+
+    sources = nodes if count <= max_sources else random.Random(seed).sample(nodes, max_sources)
+    for source in sources:
+        # Breadth-first search counting shortest paths, then accumulate dependencies in reverse
+        order = []
+        predecessors = {node: [] for node in nodes}
+        paths = dict.fromkeys(nodes, 0)
+        paths[source] = 1
+        distance = {source: 0}
+        queue = deque([source])
+        while queue:
+            node = queue.popleft()
+            order.append(node)
+            for neighbor in adjacency[node]:
+                if neighbor not in distance:
+                    distance[neighbor] = distance[node] + 1
+                    queue.append(neighbor)
+                if distance[neighbor] == distance[node] + 1:
+                    paths[neighbor] += paths[node]
+                    predecessors[neighbor].append(node)
+        dependency = dict.fromkeys(order, 0.0)
+        for node in reversed(order):
+            for predecessor in predecessors[node]:
+                dependency[predecessor] += paths[predecessor] / paths[node] * (1 + dependency[node])
+            if node != source:
+                betweenness[node] += dependency[node]
+
+    # Every pair is counted from both ends; normalize by the number of pairs not involving the node
+    scale = (count / len(sources)) / ((count - 1) * (count - 2))
+    return {node: value * scale for node, value in betweenness.items()}
+
+def _louvain_pass(graph: Dict[int, Dict[int, float]], rng: random.Random) -> Dict[int, int]:
+    """
+    One Louvain pass: move nodes between neighboring communities while that raises
+    modularity. graph maps node -> {neighbor: weight}; a self-loop holds twice the
+    weight of the edges folded into the node.
+    """
+    degree = {node: sum(neighbors.values()) for node, neighbors in graph.items()}
+    total_weight = sum(degree.values())
+    community = {node: node for node in graph}
+    community_degree = dict(degree)
+    if total_weight == 0:
+        return community
+
+    order = sorted(graph)
+    rng.shuffle(order)
+    moved = True
+    while moved:
+        moved = False
+        for node in order:
+            current = community[node]
+            links: Dict[int, float] = {}
+            for neighbor, weight in graph[node].items():
+                if neighbor != node:
+                    links[community[neighbor]] = links.get(community[neighbor], 0.0) + weight
+            community_degree[current] -= degree[node]
+            best = current
+            best_gain = links.get(current, 0.0) - community_degree[current] * degree[node] / total_weight
+            for candidate, weight in links.items():
+                gain = weight - community_degree[candidate] * degree[node] / total_weight
+                if gain > best_gain + 1e-12:
+                    best, best_gain = candidate, gain
+            community_degree[best] += degree[node]
+            if best != current:
+                community[node] = best
+                moved = True
+    return community
+
+def detect_communities(adjacency: Dict[int, Set[int]], seed: int = ANALYTICS_SEED) -> Dict[int, int]:
+    """
+    Community id per node, by Louvain modularity optimization: nodes join the
+    neighboring community that most improves modularity, then each community is
+    collapsed into a single node and the process repeats until nothing moves.
+    Ids are numbered from 0 by community size, largest first.
+    """
+    rng = random.Random(seed)
+    membership = {node: node for node in adjacency}
+    graph = {node: {neighbor: 1.0 for neighbor in neighbors} for node, neighbors in adjacency.items()}
+    while True:
+        community = _louvain_pass(graph, rng)
+        if all(node == label for node, label in community.items()):
+            break
+        membership = {node: community[label] for node, label in membership.items()}
+        aggregated: Dict[int, Dict[int, float]] = {}
+        for node, neighbors in graph.items():
+            row = aggregated.setdefault(community[node], {})
+            for neighbor, weight in neighbors.items():
+                row[community[neighbor]] = row.get(community[neighbor], 0.0) + weight
+        graph = aggregated
+
+    members: Dict[int, List[int]] = {}
+    for node, label in membership.items():
+        members.setdefault(label, []).append(node)
+    ranked = sorted(members.values(), key=lambda group: (-len(group), min(group)))
+    return {node: community for community, group in enumerate(ranked) for node in group}
+
+def _initial_positions(communities: Dict[int, int], spacing: float) -> Dict[int, List[float]]:
+    """Each community starts as a disc of its own, with larger communities nearer the middle."""
+    members: Dict[int, List[int]] = {}
+    for node, community in sorted(communities.items()):
+        members.setdefault(community, []).append(node)
+
+    positions = {}
+    placed = 0
+    for community in sorted(members):
+        group = members[community]
+        # Communities follow a spiral whose radius grows with the nodes placed before them
+        center_radius = spacing * math.sqrt(placed + len(group) / 2.0) * 0.8
+        center_angle = community * _GOLDEN_ANGLE
+        center_x, center_y = center_radius * math.cos(center_angle), center_radius * math.sin(center_angle)
+        for index, node in enumerate(group):
+            radius = spacing * 0.5 * math.sqrt(index)
+            angle = index * _GOLDEN_ANGLE
+            positions[node] = [center_x + radius * math.cos(angle), center_y + radius * math.sin(angle)]
+        placed += len(group)
+    return positions
+
+def force_layout(adjacency: Dict[int, Set[int]], communities: Dict[int, int], spacing: float = LAYOUT_NODE_SPACING,
+                 iterations: int = LAYOUT_ITERATIONS) -> Dict[int, Tuple[float, float]]:
+    """
+    Fruchterman-Reingold layout, starting from community-grouped positions.
+    Repulsion only acts between nodes within two edge lengths of each other
+    (found with a grid), so each step is roughly linear in the size of the graph.
+    Large graphs get proportionally fewer steps, down to LAYOUT_MIN_ITERATIONS.
+    """
+    positions = _initial_positions(communities, spacing)
+    if len(positions) < 2:
+        return {node: (0.0, 0.0) for node in positions}
+
+    iterations = max(LAYOUT_MIN_ITERATIONS, min(iterations, iterations * LAYOUT_FULL_ITERATION_NODES // len(positions)))
+    cell = 2 * spacing
+    cell_sq = cell * cell
+    spacing_sq = spacing * spacing
+    temperature = spacing * math.sqrt(len(positions)) / 4
+    cooling = temperature / (iterations + 1)
+    for _ in range(iterations):
+        grid: Dict[Tuple[int, int], List[Tuple[int, float, float]]] = {}
+        for node, (x, y) in positions.items():
+            grid.setdefault((int(x // cell), int(y // cell)), []).append((node, x, y))
+
+        moves = {}
+        for (cell_x, cell_y), cell_nodes in grid.items():
+            nearby = [
+                entry
+                for dx in (-1, 0, 1) for dy in (-1, 0, 1)
+                for entry in grid.get((cell_x + dx, cell_y + dy), ())
+            ]
+            for node, x, y in cell_nodes:
+                move_x = move_y = 0.0
+                for other, other_x, other_y in nearby:
+                    dx, dy = x - other_x, y - other_y
+                    distance_sq = dx * dx + dy * dy
+                    if distance_sq > cell_sq or other == node:
+                        continue
+                    if distance_sq < 0.01:
+                        # Coincident nodes: push apart in a direction fixed by their ids
+                        dx, dy, distance_sq = (1.0 if node < other else -1.0), 0.0, 1.0
+                    force = spacing_sq / distance_sq
+                    move_x += dx * force
+                    move_y += dy * force
+                moves[node] = [move_x, move_y]
+
+        for node, neighbors in adjacency.items():
+            x, y = positions[node]
+            move = moves[node]
+            for neighbor in neighbors:
+                dx, dy = x - positions[neighbor][0], y - positions[neighbor][1]
+                distance = math.sqrt(dx * dx + dy * dy)
+                move[0] -= dx * distance / spacing
+                move[1] -= dy * distance / spacing
+
+        for node, (move_x, move_y) in moves.items():
+            length = math.sqrt(move_x * move_x + move_y * move_y)
+            if length > 0:
+                step = min(length, temperature) / length
+                positions[node][0] += move_x * step
+                positions[node][1] += move_y * step
+        temperature -= cooling
+
+    center_x = sum(x for x, _ in positions.values()) / len(positions)
+    center_y = sum(y for _, y in positions.values()) / len(positions)
+    return {node: (round(x - center_x, 1), round(y - center_y, 1)) for node, (x, y) in positions.items()}
+
+def compute_graph_analytics(node_ids: Iterable[int], edges: Iterable[Tuple[int, int]]) -> Dict[int, Dict[str, Any]]:
+    """
+    Layout position, degree and betweenness centrality and community id for each node
+    of a graph, treating edges as undirected.
+    """
+    adjacency = build_adjacency(node_ids, edges)
+    degree = degree_centrality(adjacency)
+    betweenness = betweenness_centrality(adjacency)
+    communities = detect_communities(adjacency)
+    positions = force_layout(adjacency, communities)
+    return {
+        node: {
+            "x": positions[node][0],
+            "y": positions[node][1],
+            "degree_centrality": round(degree[node], 6),
+            "betweenness_centrality": round(betweenness[node], 6),
+            "community": communities[node]
+        }
+        for node in adjacency
+    }
@@ -0,0 +1,71 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+# Number of serialized episode graphs kept in memory
+GRAPH_CACHE_MAX_ENTRIES = 128
+
+class GraphCache:
+    """
+    In-process LRU cache of serialized episode graph responses.
+    Each entry holds the JSON body and its ETag, keyed by episode and response
+    variant (e.g. a top-N cut); all of an episode's entries are invalidated
+    whenever the ingest path writes to it.
+    Readers capture generation() before building a graph and pass it to put, so a
+    graph built from data that was invalidated mid-read is never stored.
+    """
+
+    def __init__(self, max_entries: int = GRAPH_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[int, Hashable], Tuple[str, bytes]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped by invalidate: per episode, and for everything at once
+        self._generations: Dict[int, int] = {}
+        self._global_generation = 0
+
+    def get(self, episode_id: int, variant: Hashable = None) -> Optional[Tuple[str, bytes]]:
+        key = (episode_id, variant)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def generation(self, episode_id: int) -> Tuple[int, int]:
+        """Token that changes whenever the episode's cached graphs are invalidated."""
+        with self._lock:
+            return self._global_generation, self._generations.get(episode_id, 0)
+
+    def put(self, episode_id: int, graph_data: Dict[str, Any], variant: Hashable = None,
+            generation: Optional[Tuple[int, int]] = None) -> Tuple[str, bytes]:
+        """
+        Serialize graph_data once, cache it and return (etag, body).
+        If generation is given and the episode has been invalidated since it was
+        taken, the graph may predate that write and is returned without being cached.
+        """
+        body = json.dumps(graph_data, separators=(",", ":")).encode("utf-8")
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        key = (episode_id, variant)
+        with self._lock:
+            if generation is not None and generation != (self._global_generation, self._generations.get(episode_id, 0)):
+                return etag, body
+            self._entries[key] = (etag, body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return etag, body
+
+    def invalidate(self, episode_id: int = None):
+        """Drop one episode's cached graphs, or every cached graph if no episode is given."""
+        with self._lock:
+            if episode_id is None:
+                self._global_generation += 1
+                self._entries.clear()
+            else:
+                self._generations[episode_id] = self._generations.get(episode_id, 0) + 1
+                for key in [key for key in self._entries if key[0] == episode_id]:
+                    del self._entries[key]
+
+graph_cache = GraphCache()
@@ -0,0 +1,156 @@
+import os
+import threading
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+# Maximum number of episodes processed at the same time
+MAX_CONCURRENT_EPISODES = int(os.getenv("MAX_CONCURRENT_EPISODES", "2"))
+
+# Events kept per job for streaming; older events are dropped first
+MAX_JOB_EVENTS = 5000
+
+# Finished jobs kept in memory for status lookups before the oldest are dropped
+MAX_FINISHED_JOBS = 500
+
+class Job:
+    """Status and progress of a single background episode processing run."""
+
+    def __init__(self, episode_id: int):
+        self.id = uuid.uuid4().hex
+        self.episode_id = episode_id
+        self.status = "queued"  # queued, running, complete, failed
+        self.stage = "queued"
+        self.chunks_completed = 0
+        self.chunks_total = None
+        self.result = None
+        self.error = None
+        self.created_at = datetime.utcnow()
+        self.started_at = None
+        self.finished_at = None
+        self.events: List[Dict[str, Any]] = []
+        self._next_event_id = 1
+        self._lock = threading.Lock()
+
+    def update_progress(self, stage: str = None, chunks_completed: int = None, chunks_total: int = None):
+        """Record pipeline progress and emit a progress event; called from worker threads."""
+        with self._lock:
+            if stage is not None:
+                self.stage = stage
+            if chunks_completed is not None:
+                self.chunks_completed = chunks_completed
+            if chunks_total is not None:
+                self.chunks_total = chunks_total
+            self._append_event("progress", {
+                "status": self.status,
+                "stage": self.stage,
+                "chunks_completed": self.chunks_completed,
+                "chunks_total": self.chunks_total
+            })
+
+    def emit(self, event: str, data: Dict[str, Any]):
+        """Append an event (e.g. chunk progress or a graph delta) for streaming clients."""
+        with self._lock:
+            self._append_event(event, data)
+
+    def events_since(self, last_event_id: int) -> List[Dict[str, Any]]:
+        """Events with an id greater than last_event_id, oldest first."""
+        with self._lock:
+            return [event for event in self.events if event["id"] > last_event_id]
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("complete", "failed")
+
+    def _append_event(self, event: str, data: Dict[str, Any]):
+        self.events.append({"id": self._next_event_id, "event": event, "data": data})
+        self._next_event_id += 1
+        if len(self.events) > MAX_JOB_EVENTS:
+            del self.events[:len(self.events) - MAX_JOB_EVENTS]
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "job_id": self.id,
+                "episode_id": self.episode_id,
+                "status": self.status,
+                "stage": self.stage,
+                "chunks_completed": self.chunks_completed,
+                "chunks_total": self.chunks_total,
+                "result": self.result,
+                "error": self.error,
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at
+            }
+
+class JobQueue:
+    """
+    In-process job queue backed by a thread pool.
+    At most max_workers jobs run at once; the rest wait in the executor's queue.
+    """
+
+    def __init__(self, max_workers: int = MAX_CONCURRENT_EPISODES):
+        self.executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="episode-job")
+        self.jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, episode_id: int, func: Callable[..., Any], *args, **kwargs) -> Job:
+        """Enqueue func(job, *args, **kwargs) and return the job immediately."""
+        job = Job(episode_id)
+        with self._lock:
+            self.jobs[job.id] = job
+            self._prune_finished_jobs()
+        self.executor.submit(self._run, job, func, args, kwargs)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def active_job_for(self, episode_id: int) -> Optional[Job]:
+        """Return the queued or running job for an episode, if any."""
+        with self._lock:
+            for job in self.jobs.values():
+                if job.episode_id == episode_id and job.status in ("queued", "running"):
+                    return job
+        return None
+
+    def shutdown(self, wait: bool = False):
+        self.executor.shutdown(wait=wait, cancel_futures=True)
+
+    def _run(self, job: Job, func: Callable[..., Any], args: tuple, kwargs: Dict[str, Any]):
+        with job._lock:
+            job.status = "running"
+            job.started_at = datetime.utcnow()
+            job._append_event("progress", {"status": job.status, "stage": job.stage,
+                                           "chunks_completed": job.chunks_completed, "chunks_total": job.chunks_total})
+
+        try:
+            result = func(job, *args, **kwargs)
+        except Exception as e:
+            print(f"Job {job.id} for episode {job.episode_id} failed: {e}")
+            traceback.print_exc()
+            with job._lock:
+                job.status = "failed"
+                job.error = str(e)
+                job.finished_at = datetime.utcnow()
+                job._append_event("failed", {"error": job.error})
+            return
+
+        with job._lock:
+            job.status = "complete"
+            job.stage = "complete"
+            job.result = result
+            job.finished_at = datetime.utcnow()
+            job._append_event("complete", {"result": result})
+
+    def _prune_finished_jobs(self):
+        finished = [job for job in self.jobs.values() if job.finished_at is not None]
+        if len(finished) <= MAX_FINISHED_JOBS:
+            return
+        finished.sort(key=lambda job: job.finished_at)
+        for job in finished[:len(finished) - MAX_FINISHED_JOBS]:
+            del self.jobs[job.id]
@@ -0,0 +1,271 @@
+import hashlib
+import json
+import os
+import random
+import re
+import time
+from typing import Any, Dict, List, Optional
+
+import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
+
+from analysis_cache import hash_file
+from upload_registry import UploadRegistry, UploadSweeper
+
+MODEL_NAME = 'gemini-2.5-pro'
+
+# Which backend AudioProcessor talks to: gemini, record, replay or synthetic
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini")
+
+# Where the record backend writes responses and the replay backend reads them
+LLM_RECORDINGS_DIR = os.getenv("LLM_RECORDINGS_DIR", "./llm_recordings")
+
+# Synthetic backend shape: simulated round-trip time and output size per chunk
+SYNTHETIC_LATENCY_S = float(os.getenv("SYNTHETIC_LATENCY_S", "2.0"))
+SYNTHETIC_ENTITIES_PER_CHUNK = int(os.getenv("SYNTHETIC_ENTITIES_PER_CHUNK", "25"))
+SYNTHETIC_ENTITY_POOL = int(os.getenv("SYNTHETIC_ENTITY_POOL", "500"))
+
+ENTITY_TYPES = ["Person", "Organization", "Event", "Concept", "Source Material"]
+
+class UploadedAudio:
+    """
+    Handle for an audio file passed to a backend.
+    sha256 identifies the audio for recordings; remote is the provider's own
+    file object when the audio was actually uploaded.
+    """
+
+    def __init__(self, path: str, sha256: str, remote: Any = None):
+        self.path = path
+        self.sha256 = sha256
+        self.remote = remote
+
+class LLMBackend:
+    """
+    Interface AudioProcessor uses for model calls.
+    Prompts are lists of strings and UploadedAudio handles; generate returns
+    the raw response text. Backends that support structured output constrain
+    the response to response_schema (a JSON schema dict) when one is given.
+    """
+
+    model_name = MODEL_NAME
+
+    def upload_file(self, path: str) -> UploadedAudio:
+        raise NotImplementedError
+
+    def generate(self, prompt_parts: List[Any], response_schema: Optional[Dict[str, Any]] = None) -> str:
+        raise NotImplementedError
+
+class GeminiBackend(LLMBackend):
+    """
+    Calls the Gemini API through google-generativeai.
+    Uploads are recorded in registry by audio hash, and audio that is still
+    uploaded is referenced again instead of being sent a second time.
+    """
+
+    def __init__(self, api_key: str, model_name: str = MODEL_NAME, registry: Optional[UploadRegistry] = None):
+        genai.configure(api_key=api_key)
+        self.model_name = model_name
+        self.model = genai.GenerativeModel(model_name=model_name)
+        self.registry = registry if registry is not None else UploadRegistry()
+
+    def upload_file(self, path: str) -> UploadedAudio:
+        audio_hash = hash_file(path)
+        existing = self.registry.get(audio_hash)
+        if existing is not None:
+            print(f"Reusing uploaded file: {existing['uri']}")
+            file_data = genai.protos.FileData(mime_type=existing["mime_type"], file_uri=existing["uri"])
+            return UploadedAudio(path, audio_hash, file_data)
+
+        remote = genai.upload_file(path=path, display_name=os.path.basename(path))
+        print(f"Completed upload: {remote.uri}")
+        expires_at = remote.expiration_time.timestamp() if remote.expiration_time else None
+        self.registry.put(audio_hash, remote.name, remote.uri, remote.mime_type, expires_at)
+        return UploadedAudio(path, audio_hash, remote)
+
+    def generate(self, prompt_parts: List[Any], response_schema: Optional[Dict[str, Any]] = None) -> str:
+        try:
+            return self._generate(prompt_parts, response_schema)
+        except (google_exceptions.NotFound, google_exceptions.PermissionDenied):
+            reused = [
+                part for part in prompt_parts
+                if isinstance(part, UploadedAudio) and isinstance(part.remote, genai.protos.FileData)
+            ]
+            if not reused:
+                raise
+            # A reused upload was deleted remotely; upload the audio again and retry once
+            for part in reused:
+                self.registry.remove(part.sha256)
+                part.remote = self.upload_file(part.path).remote
+            return self._generate(prompt_parts, response_schema)
+
+    def _generate(self, prompt_parts: List[Any], response_schema: Optional[Dict[str, Any]]) -> str:
+        parts = [part.remote if isinstance(part, UploadedAudio) else part for part in prompt_parts]
+        generation_config = None
+        if response_schema is not None:
+            generation_config = genai.GenerationConfig(response_mime_type="application/json", response_schema=response_schema)
+        return self.model.generate_content(parts, generation_config=generation_config).text
+
+def delete_uploaded_file(name: str):
+    """Delete a remote Gemini file; one that is already gone counts as deleted."""
+    try:
+        genai.delete_file(name)
+    except google_exceptions.NotFound:
+        pass
+
+def prompt_key(model_name: str, prompt_parts: List[Any]) -> str:
+    """Stable key for a prompt; audio is identified by content hash, not path."""
+    normalized = [
+        {"audio": part.sha256} if isinstance(part, UploadedAudio) else part
+        for part in prompt_parts
+    ]
+    payload = json.dumps({"model": model_name, "parts": normalized}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class RecordReplayBackend(LLMBackend):
+    """
+    Serves responses stored on disk, one JSON file per prompt key.
+    In record mode every call goes to the wrapped backend and its response is
+    saved; in replay mode nothing leaves the machine and a prompt without a
+    recording raises LookupError.
+    """
+
+    def __init__(self, recordings_dir: str = LLM_RECORDINGS_DIR, inner: Optional[LLMBackend] = None):
+        self.recordings_dir = recordings_dir
+        self.inner = inner
+        self.model_name = inner.model_name if inner is not None else MODEL_NAME
+        os.makedirs(recordings_dir, exist_ok=True)
+
+    @property
+    def recording(self) -> bool:
+        return self.inner is not None
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.recordings_dir, f"{key}.json")
+
+    def upload_file(self, path: str) -> UploadedAudio:
+        if self.recording:
+            return self.inner.upload_file(path)
+        return UploadedAudio(path, hash_file(path))
+
+    def generate(self, prompt_parts: List[Any], response_schema: Optional[Dict[str, Any]] = None) -> str:
+        key = prompt_key(self.model_name, prompt_parts)
+        path = self._path(key)
+
+        if not self.recording:
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    return json.load(f)["text"]
+            except FileNotFoundError:
+                raise LookupError(f"No recorded response for prompt {key}")
+
+        text = self.inner.generate(prompt_parts, response_schema)
+        # Write then rename so a concurrent replay never reads a partial file
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"model": self.model_name, "text": text}, f)
+        os.replace(tmp_path, path)
+        return text
+
+class SyntheticBackend(LLMBackend):
+    """
+    Generates plausible responses locally after a simulated delay.
+    Chunk prompts get entities_per_chunk entities drawn from a fixed pool, so
+    chunks overlap like real episodes do; transcription prompts (audio without
+    a response schema) get a timestamped transcript and refinement prompts echo
+    back the JSON they were given. Output is deterministic for a given prompt.
+    """
+
+    model_name = "synthetic"
+
+    def __init__(self, latency_s: float = SYNTHETIC_LATENCY_S, entities_per_chunk: int = SYNTHETIC_ENTITIES_PER_CHUNK,
+                 entity_pool: int = SYNTHETIC_ENTITY_POOL):
+        self.latency_s = latency_s
+        self.entities_per_chunk = entities_per_chunk
+        self.entity_pool = max(entity_pool, entities_per_chunk)
+
+    def upload_file(self, path: str) -> UploadedAudio:
+        return UploadedAudio(path, hash_file(path))
+
+    def generate(self, prompt_parts: List[Any], response_schema: Optional[Dict[str, Any]] = None) -> str:
+        key = prompt_key(self.model_name, prompt_parts)
+        rng = random.Random(key)
+        if self.latency_s > 0:
+            # +/-25% so concurrent calls don't complete in lockstep
+            time.sleep(self.latency_s * rng.uniform(0.75, 1.25))
+
+        has_audio = any(isinstance(part, UploadedAudio) for part in prompt_parts)
+        if has_audio and response_schema is None:
+            return self._transcript(rng)
+        if not has_audio:
+            # Refinement: the input JSON is embedded in the last prompt part
+            match = re.search(r"\{.*\}", str(prompt_parts[-1]), re.DOTALL)
+            if match:
+                return match.group(0)
+
+        return json.dumps(self._chunk_analysis(rng))
+
+    def _transcript(self, rng: random.Random) -> str:
+        ids = rng.sample(range(self.entity_pool), self.entities_per_chunk)
+        step = max(1, 300 // len(ids)) if ids else 1
+        return "\n".join(
+            f"[{n * step // 60:02d}:{n * step % 60:02d}] Speaker {n % 2 + 1}: Let's talk about Synthetic Entity {i}."
+            for n, i in enumerate(ids)
+        )
+
+    def _chunk_analysis(self, rng: random.Random) -> Dict[str, Any]:
+        ids = rng.sample(range(self.entity_pool), self.entities_per_chunk)
+        entities = [
+            {
+                "name": f"Synthetic Entity {i}",
+                "type": ENTITY_TYPES[i % len(ENTITY_TYPES)],
+                "summary": f"Synthetic entity {i} mentioned in this segment of the episode."
+            }
+            for i in ids
+        ]
+        relationships = [
+            {
+                "source": f"Synthetic Entity {a}",
+                "target": f"Synthetic Entity {b}",
+                "description": f"Synthetic Entity {a} is discussed alongside Synthetic Entity {b}."
+            }
+            for a, b in zip(ids, ids[1:])
+        ]
+        details = [
+            {"entity": f"Synthetic Entity {i}", "detail": f"Detail {rng.randrange(1000000)} about synthetic entity {i}."}
+            for i in ids for _ in range(2)
+        ]
+        return {"entities": entities, "relationships": relationships, "details": details}
+
+def create_backend(name: Optional[str] = None, api_key: Optional[str] = None) -> LLMBackend:
+    """
+    Build the backend selected by name (defaults to LLM_BACKEND).
+    gemini and record need an API key; replay and synthetic run offline.
+    """
+    name = (name or LLM_BACKEND).lower()
+    api_key = api_key or os.getenv("GEMINI_API_KEY")
+
+    if name == "synthetic":
+        return SyntheticBackend()
+    if name == "replay":
+        return RecordReplayBackend()
+    if name not in ("gemini", "record"):
+        raise ValueError(f"Unknown LLM backend: {name}")
+    if not api_key:
+        raise ValueError("GEMINI_API_KEY environment variable not set")
+
+    gemini = GeminiBackend(api_key)
+    return RecordReplayBackend(inner=gemini) if name == "record" else gemini
+
+def start_upload_sweeper(name: Optional[str] = None, api_key: Optional[str] = None) -> Optional[UploadSweeper]:
+    """
+    Start the background sweeper for stale Gemini uploads.
+    Returns None (and starts nothing) for offline backends or without an API key.
+    """
+    name = (name or LLM_BACKEND).lower()
+    api_key = api_key or os.getenv("GEMINI_API_KEY")
+    if name not in ("gemini", "record") or not api_key:
+        return None
+    genai.configure(api_key=api_key)
+    sweeper = UploadSweeper(UploadRegistry(), delete_uploaded_file)
+    sweeper.start()
+    return sweeper
@@ -0,0 +1,170 @@
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+from typing import Any, Callable, Dict
+
+from google.api_core import exceptions as google_exceptions
+
+# Gemini quota for the whole process (0 disables a limit)
+GEMINI_REQUESTS_PER_MINUTE = float(os.getenv("GEMINI_REQUESTS_PER_MINUTE", "60"))
+GEMINI_TOKENS_PER_MINUTE = float(os.getenv("GEMINI_TOKENS_PER_MINUTE", "1000000"))
+
+# Retries for rate-limit and transient server errors, with exponential backoff and jitter
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "5"))
+LLM_BACKOFF_BASE_S = float(os.getenv("LLM_BACKOFF_BASE_S", "2"))
+LLM_BACKOFF_MAX_S = float(os.getenv("LLM_BACKOFF_MAX_S", "60"))
+
+# Lower runs first. Refinement finishes episodes already in progress, so it goes
+# ahead of analysis, which goes ahead of uploads for new chunks.
+PRIORITY_REFINE = 0
+PRIORITY_ANALYZE = 1
+PRIORITY_UPLOAD = 2
+
+# Gemini bills audio input at 32 tokens per second
+AUDIO_TOKENS_PER_SECOND = 32
+
+RATE_LIMIT_ERRORS = (google_exceptions.ResourceExhausted, google_exceptions.TooManyRequests)
+RETRYABLE_ERRORS = RATE_LIMIT_ERRORS + (
+    google_exceptions.InternalServerError,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.GatewayTimeout,
+    google_exceptions.DeadlineExceeded,
+    ConnectionError,
+    TimeoutError,
+)
+
+def estimate_tokens(text_chars: int = 0, audio_seconds: float = 0) -> int:
+    """Rough input token count: ~4 characters per text token plus audio at the billed rate."""
+    return int(text_chars / 4 + audio_seconds * AUDIO_TOKENS_PER_SECOND)
+
+class TokenBucket:
+    """
+    Refills at rate_per_minute up to one minute's worth of capacity.
+    Not thread-safe on its own; LLMScheduler guards it with its lock.
+    """
+
+    def __init__(self, rate_per_minute: float):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = rate_per_minute
+        self.tokens = rate_per_minute
+        self.updated = time.monotonic()
+
+    @property
+    def unlimited(self) -> bool:
+        return self.rate <= 0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until amount tokens are available (0 if they are now)."""
+        if self.unlimited:
+            return 0.0
+        self._refill(now)
+        # A request larger than the bucket would never fit; let it through on a full bucket
+        amount = min(amount, self.capacity)
+        return max(0.0, (amount - self.tokens) / self.rate)
+
+    def take(self, amount: float):
+        if not self.unlimited:
+            self.tokens -= min(amount, self.capacity)
+
+class LLMScheduler:
+    """
+    Process-wide gate for Gemini calls.
+    Callers wait in a single priority queue; only the head of the queue may take
+    request and token budget, so a waiting refinement is never overtaken by new
+    chunk work. Retryable errors are retried with exponential backoff and jitter,
+    and a rate-limit error pauses every caller until the backoff has passed.
+    """
+
+    def __init__(self, requests_per_minute: float = GEMINI_REQUESTS_PER_MINUTE,
+                 tokens_per_minute: float = GEMINI_TOKENS_PER_MINUTE, max_retries: int = LLM_MAX_RETRIES,
+                 backoff_base_s: float = LLM_BACKOFF_BASE_S, backoff_max_s: float = LLM_BACKOFF_MAX_S):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_retries = max_retries
+        self.backoff_base_s = backoff_base_s
+        self.backoff_max_s = backoff_max_s
+        self._cond = threading.Condition()
+        self._queue = []
+        self._seq = itertools.count()
+        self._paused_until = 0.0
+        self._stats = {"calls": 0, "retries": 0, "rate_limited": 0, "failures": 0, "wait_seconds": 0.0}
+
+    def call(self, func: Callable[[], Any], priority: int = PRIORITY_ANALYZE, tokens: int = 0,
+             requests: int = 1) -> Any:
+        """
+        Run func once budget for requests and tokens is available, retrying
+        retryable errors. Blocks the calling thread; raises the last error once
+        retries are exhausted or for errors that are not retryable.
+        """
+        # The sequence number is kept across retries so a retried call keeps its place
+        entry = (priority, next(self._seq))
+        attempt = 0
+        while True:
+            self._acquire(entry, requests, tokens)
+            try:
+                result = func()
+            except RETRYABLE_ERRORS as e:
+                if attempt >= self.max_retries:
+                    self._count("failures")
+                    raise
+                delay = self._backoff(attempt)
+                attempt += 1
+                rate_limited = isinstance(e, RATE_LIMIT_ERRORS)
+                print(f"Retryable model error ({type(e).__name__}: {e}); retry {attempt}/{self.max_retries} in {delay:.1f}s")
+                with self._cond:
+                    self._stats["retries"] += 1
+                    if rate_limited:
+                        # Everyone is over quota, not just this caller
+                        self._stats["rate_limited"] += 1
+                        self._paused_until = max(self._paused_until, time.monotonic() + delay)
+                        self._cond.notify_all()
+                if not rate_limited:
+                    time.sleep(delay)
+                continue
+            self._count("calls")
+            return result
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {**self._stats, "waiting": len(self._queue)}
+
+    def _backoff(self, attempt: int) -> float:
+        delay = min(self.backoff_max_s, self.backoff_base_s * (2 ** attempt))
+        return delay * random.uniform(0.5, 1.0)
+
+    def _count(self, key: str):
+        with self._cond:
+            self._stats[key] += 1
+
+    def _acquire(self, entry, requests: int, tokens: int):
+        started = time.monotonic()
+        with self._cond:
+            heapq.heappush(self._queue, entry)
+            while True:
+                now = time.monotonic()
+                if self._queue[0] != entry:
+                    self._cond.wait()
+                    continue
+                wait = max(
+                    self._paused_until - now,
+                    self.requests.wait_time(requests, now),
+                    self.tokens.wait_time(tokens, now),
+                )
+                if wait <= 0:
+                    break
+                self._cond.wait(wait)
+            self.requests.take(requests)
+            self.tokens.take(tokens)
+            heapq.heappop(self._queue)
+            self._stats["wait_seconds"] += time.monotonic() - started
+            self._cond.notify_all()
+
+# Shared by every AudioProcessor so concurrent episodes draw from one quota
+llm_scheduler = LLMScheduler()
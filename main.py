@@ -1,13 +1,25 @@
 import os
-from fastapi import FastAPI, UploadFile, File, Depends, HTTPException, Form
+import asyncio
+import contextlib
+import json
+import re
+import time
+from fastapi import FastAPI, UploadFile, File, Depends, HTTPException, Form, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-import tempfile
 import shutil
+import uuid
+from typing import Any, Callable, Optional
 
-from database import create_tables, get_db
-from audio_processor import AudioProcessor
-from data_service import DataService
+from database import Episode, create_tables, get_db, get_async_db, SessionLocal, async_engine
+from audio_processor import AudioProcessor, shutdown_encode_pool
+from llm_backend import create_backend, start_upload_sweeper
+from data_service import DataService, analysis_graph_delta
+from job_queue import Job, JobQueue
+from metrics import HTTP_REQUEST_SECONDS, render_metrics, time_stage
 
 app = FastAPI(title="Podcast Relationship Mapper", version="1.0.0")
 
@@ -20,6 +32,30 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Streaming and scrape endpoints are excluded from read latency metrics
+UNTIMED_PATHS = ("/metrics",)
+
+@app.middleware("http")
+async def record_read_latency(request: Request, call_next):
+    """Record latency histograms for read (GET) requests, labeled by route template."""
+    if request.method != "GET" or request.url.path in UNTIMED_PATHS or request.url.path.endswith("/events"):
+        return await call_next(request)
+    started = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    HTTP_REQUEST_SECONDS.observe(
+        time.perf_counter() - started,
+        method=request.method,
+        route=route.path if route is not None else "unmatched",
+        status=response.status_code
+    )
+    return response
+
+@app.get("/metrics")
+async def metrics():
+    """Pipeline stage and request latency histograms in Prometheus text format."""
+    return Response(content=render_metrics(), media_type="text/plain; version=0.0.4")
+
 # Add a simple test endpoint
 @app.get("/test")
 async def test():
@@ -28,12 +64,43 @@ async def test():
 # Initialize database
 create_tables()
 
-# Initialize audio processor (requires GEMINI_API_KEY environment variable)
+# Initialize audio processor (the gemini and record backends require GEMINI_API_KEY)
 def get_audio_processor():
-    api_key = os.getenv("GEMINI_API_KEY")
-    if not api_key:
-        raise HTTPException(status_code=500, detail="GEMINI_API_KEY environment variable not set")
-    return AudioProcessor(api_key)
+    try:
+        backend = create_backend()
+    except ValueError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return AudioProcessor(backend=backend)
+
+# Uploaded audio is kept here until its episode completes, so failed runs can be resumed
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "./uploads")
+os.makedirs(UPLOAD_DIR, exist_ok=True)
+
+# Background workers for episode processing; bounded by MAX_CONCURRENT_EPISODES
+job_queue = JobQueue()
+
+# Deletes uploaded Gemini files that are no longer being reused
+upload_sweeper = None
+
+@app.on_event("startup")
+def start_sweeping_uploads():
+    global upload_sweeper
+    upload_sweeper = start_upload_sweeper()
+
+@app.on_event("shutdown")
+async def shutdown_job_queue():
+    job_queue.shutdown(wait=False)
+    if upload_sweeper is not None:
+        upload_sweeper.stop()
+    shutdown_encode_pool()
+    await async_engine.dispose()
+
+async def run_read(db: AsyncSession, read: Callable[[DataService], Any]) -> Any:
+    """
+    Run a DataService read on an async session. The queries go through the async
+    driver, so the event loop keeps serving other requests while they run.
+    """
+    return await db.run_sync(lambda session: read(DataService(session)))
 
 @app.get("/")
 async def root():
@@ -46,75 +113,375 @@ async def create_episode(title: str = Form(...), episode_url: str = Form(None),
     episode = data_service.create_episode(title, episode_url)
     return {"episode_id": episode.id, "title": episode.title, "status": episode.status}
 
-@app.post("/api/episodes/{episode_id}/process")
-async def process_episode_audio(
+def store_graph_analytics(data_service: DataService, episode_id: int):
+    """
+    Precompute the episode's graph layout, centralities and communities. A failure
+    here leaves the stored graph intact; the frontend then lays it out itself.
+    """
+    try:
+        with time_stage("graph_analytics", episode_id):
+            nodes = data_service.store_graph_analytics(episode_id)
+        print(f"Stored layout and analytics for {nodes} nodes of episode {episode_id}")
+    except Exception as e:
+        print(f"Error computing graph analytics for episode {episode_id}: {e}")
+
+def run_episode_pipeline(job: Job, episode_id: int, audio_file_path: str, audio_processor: AudioProcessor, resume: bool = False):
+    """
+    Run the full processing pipeline for an episode on a job worker thread.
+    Each chunk's analysis is checkpointed as it completes; with resume=True only
+    chunks without a checkpoint are analyzed before refinement.
+    """
+    db = SessionLocal()
+    data_service = DataService(db)
+
+    def on_progress(event: str, data: dict):
+        if event in ("chunk_encoded", "chunk_uploaded"):
+            job.emit(event, data)
+        elif event == "chunk_analyzed":
+            job.update_progress(chunks_completed=len(checkpoints) + data["completed"], chunks_total=data["total"])
+            job.emit("chunk_analyzed", {"index": data["index"], "failed": "error" in data["result"]["analysis"]})
+            job.emit("graph_delta", analysis_graph_delta(data["result"]["analysis"]))
+            if "error" not in data["result"]["analysis"]:
+                # Analysis threads get their own session; the job's session stays on this thread
+                checkpoint_db = SessionLocal()
+                try:
+                    with time_stage("db_write", episode_id):
+                        DataService(checkpoint_db).save_chunk_checkpoint(episode_id, data["result"])
+                finally:
+                    checkpoint_db.close()
+
+    try:
+        # Update episode status to processing
+        data_service.update_episode_status(episode_id, "processing")
+
+        if resume:
+            checkpoints = data_service.get_chunk_checkpoints(episode_id)
+            print(f"Resuming episode {episode_id} with {len(checkpoints)} checkpointed chunks")
+        else:
+            data_service.clear_chunk_checkpoints(episode_id)
+            checkpoints = {}
+
+        # Stream what earlier runs already found before analyzing the rest
+        for checkpoint in checkpoints.values():
+            job.emit("graph_delta", analysis_graph_delta(checkpoint["analysis"]))
+
+        # Process the audio file
+        job.update_progress(stage="analyzing", chunks_completed=len(checkpoints))
+        new_results = audio_processor.process_full_audio(
+            audio_file_path, episode_id, progress_callback=on_progress, skip_chunks=set(checkpoints)
+        )
+        analysis_results = sorted(
+            list(checkpoints.values()) + new_results, key=lambda result: result["timestamp_start"]
+        )
+        chunks_failed = sum(1 for result in analysis_results if "error" in result["analysis"])
+
+        # Perform final refinement step
+        job.update_progress(stage="refining")
+        refined_analysis = audio_processor.refine_full_analysis(analysis_results)
+
+        # Store the single refined result in the database, replacing any graph an earlier
+        # (partial, resumed or re-uploaded) run stored for the episode
+        job.update_progress(stage="storing")
+        with time_stage("db_write", episode_id):
+            data_service.process_refined_analysis(episode_id, refined_analysis, replace=True)
+        job.update_progress(stage="stored")
+        store_graph_analytics(data_service, episode_id)
+
+        if chunks_failed:
+            # The graph so far is stored; keep the audio so resume can re-analyze the failed chunks
+            data_service.update_episode_status(episode_id, "partial")
+        else:
+            # Update episode status to complete; the audio is no longer needed
+            data_service.update_episode_status(episode_id, "complete")
+            data_service.set_episode_audio_path(episode_id, None)
+            # Best effort: a file that is already gone must not fail a finished episode
+            with contextlib.suppress(OSError):
+                os.unlink(audio_file_path)
+
+        return {
+            "message": f"Processed audio; {chunks_failed} chunks failed and can be resumed." if chunks_failed
+                       else "Successfully processed and refined audio.",
+            "chunks_processed": len(analysis_results),
+            "chunks_resumed": len(checkpoints),
+            "chunks_failed": chunks_failed,
+            "final_entities": len(refined_analysis.get("entities", []))
+        }
+
+    except Exception:
+        # Update episode status to failed; keep the audio and checkpoints for resume
+        db.rollback()
+        data_service.update_episode_status(episode_id, "failed")
+        raise
+
+    finally:
+        db.close()
+
+def run_reextraction(job: Job, episode_id: int, audio_processor: AudioProcessor):
+    """
+    Re-extract an episode's graph from its stored chunk transcripts on a job worker thread.
+    Only text calls are made; the stored graph is replaced in one transaction, and
+    on failure the episode keeps its previous graph and status. Chunks that fail to
+    re-extract fall back to their checkpointed analysis.
+    """
+    db = SessionLocal()
+    data_service = DataService(db)
+    previous_status = db.get(Episode, episode_id).status
+
+    try:
+        data_service.update_episode_status(episode_id, "processing")
+        transcripts = data_service.get_chunk_transcripts(episode_id)
+        checkpoints = data_service.get_chunk_checkpoints(episode_id)
+
+        job.update_progress(stage="extracting", chunks_completed=0, chunks_total=len(transcripts))
+        results = audio_processor.extract_from_transcripts(transcripts, episode_id)
+        chunks_failed = sum(1 for result in results if "error" in result["analysis"])
+        # The stored graph is replaced, so a chunk that fails to re-extract keeps its previous analysis
+        results = [
+            checkpoints.get(result["chunk_index"], result) if "error" in result["analysis"] else result
+            for result in results
+        ]
+        for result in results:
+            job.emit("graph_delta", analysis_graph_delta(result["analysis"]))
+            if "error" not in result["analysis"]:
+                with time_stage("db_write", episode_id):
+                    data_service.save_chunk_checkpoint(episode_id, result)
+        job.update_progress(chunks_completed=len(results))
+
+        job.update_progress(stage="refining")
+        refined_analysis = audio_processor.refine_full_analysis(results)
+
+        job.update_progress(stage="storing")
+        with time_stage("db_write", episode_id):
+            data_service.process_refined_analysis(episode_id, refined_analysis, replace=True)
+        job.update_progress(stage="stored")
+        store_graph_analytics(data_service, episode_id)
+        # Chunks whose audio analysis failed have no transcript; a partial episode still needs resume
+        data_service.update_episode_status(episode_id, "partial" if previous_status == "partial" else "complete")
+
+        return {
+            "message": "Successfully re-extracted episode from transcripts.",
+            "chunks_processed": len(results),
+            "chunks_failed": chunks_failed,
+            "final_entities": len(refined_analysis.get("entities", []))
+        }
+
+    except Exception:
+        db.rollback()
+        data_service.update_episode_status(episode_id, previous_status)
+        raise
+
+    finally:
+        db.close()
+
+def save_upload(episode_id: int, audio_file: UploadFile) -> str:
+    """Save an uploaded audio file under UPLOAD_DIR and return its path."""
+    suffix = os.path.splitext(audio_file.filename or "")[1] or ".mp3"
+    path = os.path.join(UPLOAD_DIR, f"episode_{episode_id}_{uuid.uuid4().hex}{suffix}")
+    with open(path, "wb") as f:
+        shutil.copyfileobj(audio_file.file, f)
+    return path
+
+# Plain def: FastAPI runs these in its threadpool, so the upload copy and the sync
+# database calls don't block the event loop
+@app.post("/api/episodes/{episode_id}/process", status_code=202)
+def process_episode_audio(
     episode_id: int,
     audio_file: UploadFile = File(...),
     db: Session = Depends(get_db)
 ):
-    """Upload and process an audio file for an episode."""
+    """Upload an audio file for an episode and enqueue it for background processing."""
     data_service = DataService(db)
     audio_processor = get_audio_processor()
+
+    episode = db.get(Episode, episode_id)
+    if not episode:
+        raise HTTPException(status_code=404, detail="Episode not found")
+    if job_queue.active_job_for(episode_id):
+        raise HTTPException(status_code=409, detail="Episode is already being processed")
     
-    # Update episode status to processing
-    data_service.update_episode_status(episode_id, "processing")
-    
+    # Keep the upload until processing completes so a failed run can be resumed
+    previous_audio_path = episode.audio_path
+    audio_file_path = save_upload(episode_id, audio_file)
+    data_service.set_episode_audio_path(episode_id, audio_file_path)
+    # A new upload replaces the audio of an earlier failed or abandoned run
+    if previous_audio_path and previous_audio_path != audio_file_path:
+        with contextlib.suppress(OSError):
+            os.unlink(previous_audio_path)
+
+    data_service.update_episode_status(episode_id, "queued")
+    job = job_queue.submit(episode_id, run_episode_pipeline, episode_id, audio_file_path, audio_processor)
+
+    return {"job_id": job.id, "episode_id": episode_id, "status": job.status}
+
+@app.post("/api/episodes/{episode_id}/resume", status_code=202)
+def resume_episode_processing(episode_id: int, db: Session = Depends(get_db)):
+    """Resume an interrupted, failed or partial run, analyzing only chunks without a checkpoint."""
+    episode = db.get(Episode, episode_id)
+    if not episode:
+        raise HTTPException(status_code=404, detail="Episode not found")
+    if episode.status == "complete":
+        raise HTTPException(status_code=409, detail="Episode is already complete")
+    if job_queue.active_job_for(episode_id):
+        raise HTTPException(status_code=409, detail="Episode is already being processed")
+    if not episode.audio_path or not os.path.exists(episode.audio_path):
+        raise HTTPException(status_code=409, detail="Uploaded audio is no longer available; upload it again")
+
+    audio_processor = get_audio_processor()
+    DataService(db).update_episode_status(episode_id, "queued")
+    job = job_queue.submit(episode_id, run_episode_pipeline, episode_id, episode.audio_path, audio_processor, resume=True)
+
+    return {"job_id": job.id, "episode_id": episode_id, "status": job.status}
+
+@app.post("/api/episodes/{episode_id}/reextract", status_code=202)
+def reextract_episode(episode_id: int, db: Session = Depends(get_db)):
+    """Rebuild an episode's graph from its stored transcripts, without the audio."""
+    if not db.get(Episode, episode_id):
+        raise HTTPException(status_code=404, detail="Episode not found")
+    if job_queue.active_job_for(episode_id):
+        raise HTTPException(status_code=409, detail="Episode is already being processed")
+    if not DataService(db).get_chunk_transcripts(episode_id):
+        raise HTTPException(status_code=409, detail="Episode has no stored transcripts; process it with TRANSCRIPT_FIRST enabled")
+
+    audio_processor = get_audio_processor()
+    job = job_queue.submit(episode_id, run_reextraction, episode_id, audio_processor)
+
+    return {"job_id": job.id, "episode_id": episode_id, "status": job.status}
+
+@app.get("/api/jobs/{job_id}")
+async def get_job_status(job_id: str):
+    """Get status and progress of a background processing job."""
+    job = job_queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+@app.get("/api/jobs/{job_id}/events")
+async def stream_job_events(job_id: str, request: Request):
+    """
+    Stream job progress as Server-Sent Events: progress (stage and chunk counts),
+    chunk_encoded, chunk_uploaded, chunk_analyzed, graph_delta (provisional nodes
+    and edges from each analyzed chunk), then complete or failed.
+    Reconnecting clients resume after the Last-Event-ID they received.
+    """
+    job = job_queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
     try:
-        # Save uploaded file to temporary location
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.mp3') as temp_file:
-            shutil.copyfileobj(audio_file.file, temp_file)
-            temp_file_path = temp_file.name
-        
-        try:
-            # Process the audio file
-            analysis_results = audio_processor.process_full_audio(temp_file_path, episode_id)
-            
-            # Perform final refinement step
-            refined_analysis = audio_processor.refine_full_analysis(analysis_results)
-
-            # Store the single refined result in the database
-            data_service.process_refined_analysis(episode_id, refined_analysis)
-            
-            # Update episode status to complete
-            data_service.update_episode_status(episode_id, "complete")
-            
-            return {
-                "message": "Successfully processed and refined audio.",
-                "final_entities": len(refined_analysis.get("entities", []))
-            }
-            
-        finally:
-            # Clean up temporary file
-            os.unlink(temp_file_path)
-            
-    except Exception as e:
-        # Update episode status to failed
-        data_service.update_episode_status(episode_id, "failed")
-        raise HTTPException(status_code=500, detail=f"Error processing audio: {str(e)}")
+        last_event_id = int(request.headers.get("last-event-id") or 0)
+    except ValueError:
+        last_event_id = 0
+
+    async def event_stream():
+        nonlocal last_event_id
+        idle_seconds = 0.0
+        while True:
+            events = job.events_since(last_event_id)
+            for event in events:
+                last_event_id = event["id"]
+                yield f"id: {event['id']}\nevent: {event['event']}\ndata: {json.dumps(event['data'], default=str)}\n\n"
+
+            if job.finished and not job.events_since(last_event_id):
+                break
+            if await request.is_disconnected():
+                break
+
+            if events:
+                idle_seconds = 0.0
+            elif idle_seconds >= 15:
+                # Comment line keeps proxies from closing an idle stream
+                yield ": keepalive\n\n"
+                idle_seconds = 0.0
+            await asyncio.sleep(0.5)
+            idle_seconds += 0.5
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# An entity tag in an If-None-Match list: "*", or an optionally weak (W/) quoted tag
+ENTITY_TAG = re.compile(r'\*|(?:W/)?"[^"]*"')
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """
+    Whether an If-None-Match header lists etag. Tags are compared weakly, as
+    If-None-Match requires: a W/ prefix on either side is ignored.
+    """
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for tag in ENTITY_TAG.findall(if_none_match):
+        if tag == "*" or (tag[2:] if tag.startswith("W/") else tag) == opaque:
+            return True
+    return False
 
 @app.get("/api/episodes/{episode_id}/graph")
-async def get_episode_graph(episode_id: int, db: Session = Depends(get_db)):
-    """Get graph data (nodes and edges) for an episode."""
-    data_service = DataService(db)
-    graph_data = data_service.get_episode_graph_data(episode_id)
-    return graph_data
+async def get_episode_graph(
+    episode_id: int,
+    request: Request,
+    top: Optional[int] = Query(None, ge=1, le=5000),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get graph data (nodes and edges) for an episode, optionally only the top nodes by centrality."""
+    etag, body = await run_read(db, lambda data_service: data_service.get_episode_graph_response(episode_id, top_n=top))
+
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match", ""), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
 
 @app.get("/api/entities/{entity_id}/details")
-async def get_entity_details(entity_id: int, db: Session = Depends(get_db)):
-    """Get detailed information about a specific entity."""
-    data_service = DataService(db)
-    entity_details = data_service.get_entity_details(entity_id)
+async def get_entity_details(
+    entity_id: int,
+    episode_id: Optional[int] = None,
+    cursor: Optional[int] = None,
+    limit: int = Query(100, ge=1, le=500),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get detailed information about a specific entity, paginated by cursor."""
+    entity_details = await run_read(
+        db, lambda data_service: data_service.get_entity_details(entity_id, episode_id=episode_id, cursor=cursor, limit=limit)
+    )
     
     if not entity_details:
         raise HTTPException(status_code=404, detail="Entity not found")
     
     return entity_details
 
+@app.get("/api/entities/{entity_id}/neighborhood")
+async def get_entity_neighborhood(
+    entity_id: int,
+    depth: int = Query(2, ge=1, le=6),
+    limit: int = Query(200, ge=1, le=1000),
+    edge_limit: int = Query(1000, ge=1, le=10000),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get the k-hop neighborhood of an entity across all episodes."""
+    neighborhood = await run_read(
+        db, lambda data_service: data_service.get_entity_neighborhood(entity_id, depth=depth, node_limit=limit, edge_limit=edge_limit)
+    )
+
+    if not neighborhood:
+        raise HTTPException(status_code=404, detail="Entity not found")
+
+    return neighborhood
+
+@app.get("/api/search")
+async def search(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Full-text search over entities and their details, with episode/timestamp references."""
+    results = await run_read(db, lambda data_service: data_service.search_entities(q, limit=limit))
+    return {"query": q, "results": results}
+
 @app.get("/api/episodes")
-async def list_episodes(db: Session = Depends(get_db)):
+async def list_episodes(db: AsyncSession = Depends(get_async_db)):
     """List all episodes."""
-    from database import Episode
-    episodes = db.query(Episode).all()
+    episodes = await db.execute(
+        select(Episode.id, Episode.title, Episode.episode_url, Episode.status, Episode.processed_at)
+    )
     return [
         {
             "id": ep.id,
@@ -0,0 +1,97 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+# Pipeline stages range from milliseconds (JSON parse) to minutes (refinement)
+STAGE_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+HTTP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(pairs: List[Tuple[str, str]]) -> str:
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Histogram:
+    """
+    Cumulative histogram with labels, rendered in the Prometheus text format.
+    Every label in label_names must be given to observe (as a keyword).
+    """
+
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...], buckets: Tuple[float, ...]):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        # label values -> [per-bucket counts..., +Inf count, sum]
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels[name]) for name in self.label_names)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[len(self.buckets)] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the wall time of the with-block, even if it raises."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((key, list(values)) for key, values in self._series.items())
+        for key, values in series:
+            pairs = list(zip(self.label_names, key))
+            for bound, count in zip(self.buckets, values):
+                lines.append(f"{self.name}_bucket{_format_labels(pairs + [('le', _format_value(float(bound)))])} {count}")
+            count = values[len(self.buckets)]
+            lines.append(f"{self.name}_bucket{_format_labels(pairs + [('le', '+Inf')])} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(pairs)} {_format_value(values[-1])}")
+            lines.append(f"{self.name}_count{_format_labels(pairs)} {count}")
+        return lines
+
+PIPELINE_STAGE_SECONDS = Histogram(
+    "podcast_pipeline_stage_seconds",
+    "Time spent in each episode processing stage.",
+    ("stage", "episode"),
+    STAGE_BUCKETS
+)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "podcast_http_request_duration_seconds",
+    "Latency of read API requests.",
+    ("method", "route", "status"),
+    HTTP_BUCKETS
+)
+
+METRICS = [PIPELINE_STAGE_SECONDS, HTTP_REQUEST_SECONDS]
+
+def observe_stage(stage: str, seconds: float, episode_id: Optional[int] = None):
+    PIPELINE_STAGE_SECONDS.observe(seconds, stage=stage, episode="" if episode_id is None else episode_id)
+
+def time_stage(stage: str, episode_id: Optional[int] = None):
+    """Context manager timing one pipeline stage (decode, upload, generate, refine, ...)."""
+    return PIPELINE_STAGE_SECONDS.time(stage=stage, episode="" if episode_id is None else episode_id)
+
+def render_metrics() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
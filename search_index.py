@@ -0,0 +1,200 @@
+import html
+import re
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+# Full-text indexes (SQLite FTS5). Rowids are the entity and detail ids; tokens are
+# case- and accent-insensitive, so "Jose" matches "José".
+SEARCH_INDEX_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS entity_fts USING fts5(
+        name, summary, tokenize = 'unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS detail_fts USING fts5(
+        detail_text, entity_id UNINDEXED, tokenize = 'unicode61 remove_diacritics 2'
+    )
+    """,
+]
+
+# Name matches count for more than summary matches
+ENTITY_HITS_SQL = """
+SELECT rowid AS entity_id,
+       bm25(entity_fts, 10.0, 1.0) AS score,
+       snippet(entity_fts, -1, char(2), char(3), '…', 16) AS snippet
+FROM entity_fts
+WHERE entity_fts MATCH :query
+ORDER BY score
+LIMIT :limit
+"""
+
+DETAIL_HITS_SQL = """
+SELECT hits.detail_id, hits.entity_id, hits.score, hits.snippet,
+       sources.episode_id, episodes.title AS episode_title, sources.timestamp_start, sources.timestamp_end
+FROM (
+    SELECT rowid AS detail_id, entity_id, bm25(detail_fts) AS score,
+           snippet(detail_fts, 0, char(2), char(3), '…', 16) AS snippet
+    FROM detail_fts
+    WHERE detail_fts MATCH :query
+    ORDER BY score
+    LIMIT :limit
+) AS hits
+JOIN details ON details.id = hits.detail_id
+JOIN sources ON sources.id = details.source_id
+JOIN episodes ON episodes.id = sources.episode_id
+ORDER BY hits.score
+"""
+
+# Detail hits considered per search; enough to rank entities without scanning every match
+DETAIL_HIT_LIMIT = 500
+# Weight of an entity's best detail match relative to a direct name/summary match
+DETAIL_SCORE_WEIGHT = 0.5
+MAX_REFERENCES_PER_ENTITY = 5
+
+def _is_sqlite(db: Session) -> bool:
+    return db.get_bind().dialect.name == "sqlite"
+
+def create_search_index(engine):
+    """Create the FTS tables and, the first time, fill them from existing rows."""
+    if engine.dialect.name != "sqlite":
+        return
+    with engine.begin() as conn:
+        for ddl in SEARCH_INDEX_DDL:
+            conn.execute(text(ddl))
+        if conn.execute(text("SELECT COUNT(*) FROM entity_fts")).scalar() == 0:
+            conn.execute(text("INSERT INTO entity_fts(rowid, name, summary) SELECT id, name, COALESCE(summary, '') FROM entities"))
+        if conn.execute(text("SELECT COUNT(*) FROM detail_fts")).scalar() == 0:
+            conn.execute(text("INSERT INTO detail_fts(rowid, detail_text, entity_id) SELECT id, detail_text, entity_id FROM details"))
+
+def index_entities(db: Session, entity_ids: Iterable[int]):
+    """(Re)index the name and summary of the given entities in the current transaction."""
+    ids = sorted(set(entity_ids))
+    if not ids or not _is_sqlite(db):
+        return
+    for start in range(0, len(ids), 500):
+        batch = ",".join(str(int(entity_id)) for entity_id in ids[start:start + 500])
+        db.execute(text(f"DELETE FROM entity_fts WHERE rowid IN ({batch})"))
+        db.execute(text(
+            f"INSERT INTO entity_fts(rowid, name, summary) "
+            f"SELECT id, name, COALESCE(summary, '') FROM entities WHERE id IN ({batch})"
+        ))
+
+def index_details(db: Session, detail_ids: Iterable[int]):
+    """Index the given (new) details in the current transaction."""
+    ids = sorted(set(detail_ids))
+    if not ids or not _is_sqlite(db):
+        return
+    for start in range(0, len(ids), 500):
+        batch = ",".join(str(int(detail_id)) for detail_id in ids[start:start + 500])
+        db.execute(text(
+            f"INSERT INTO detail_fts(rowid, detail_text, entity_id) "
+            f"SELECT id, detail_text, entity_id FROM details WHERE id IN ({batch})"
+        ))
+
+def index_episode_details(db: Session, episode_id: int):
+    """Index an episode's details that are not in the index yet, in the current transaction."""
+    if not _is_sqlite(db):
+        return
+    db.execute(text("""
+        INSERT INTO detail_fts(rowid, detail_text, entity_id)
+        SELECT details.id, details.detail_text, details.entity_id
+        FROM details JOIN sources ON sources.id = details.source_id
+        WHERE sources.episode_id = :episode_id
+          AND NOT EXISTS (SELECT 1 FROM detail_fts WHERE detail_fts.rowid = details.id)
+    """), {"episode_id": episode_id})
+
+def unindex_episode_details(db: Session, episode_id: int):
+    """Drop an episode's details from the index; call before deleting the detail rows."""
+    if not _is_sqlite(db):
+        return
+    db.execute(text("""
+        DELETE FROM detail_fts WHERE rowid IN (
+            SELECT details.id FROM details JOIN sources ON sources.id = details.source_id
+            WHERE sources.episode_id = :episode_id
+        )
+    """), {"episode_id": episode_id})
+
+def _highlight(snippet: Optional[str]) -> Optional[str]:
+    """HTML-escape a snippet and turn its match markers into <mark> tags."""
+    if snippet is None:
+        return None
+    return html.escape(snippet).replace("\x02", "<mark>").replace("\x03", "</mark>")
+
+def fts_query(query: str) -> Optional[str]:
+    """
+    Turn free text into a safe FTS5 query: every word must match, and the last
+    word also matches as a prefix so results update while typing.
+    Returns None if the text has no searchable words.
+    """
+    words = re.findall(r"\w+", query)
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+def search_entities(db: Session, query: str, limit: int = 20) -> List[Dict[str, Any]]:
+    """
+    Rank entities whose name, summary or details match query.
+    Each result carries an HTML-escaped snippet with matches wrapped in <mark>, and
+    references to the episodes and time ranges of its matching details.
+    bm25 scores are negative (lower is better); results report them negated.
+    """
+    match = fts_query(query)
+    if match is None or not _is_sqlite(db):
+        return []
+
+    results: Dict[int, Dict[str, Any]] = {}
+
+    def result_for(entity_id: int) -> Dict[str, Any]:
+        if entity_id not in results:
+            results[entity_id] = {"id": entity_id, "score": 0.0, "snippet": None, "references": []}
+        return results[entity_id]
+
+    for row in db.execute(text(ENTITY_HITS_SQL), {"query": match, "limit": limit}):
+        result = result_for(row.entity_id)
+        result["score"] = row.score
+        result["snippet"] = _highlight(row.snippet)
+
+    best_detail_score: Dict[int, float] = {}
+    for row in db.execute(text(DETAIL_HITS_SQL), {"query": match, "limit": DETAIL_HIT_LIMIT}):
+        entity_id = int(row.entity_id)
+        result = result_for(entity_id)
+        if entity_id not in best_detail_score:
+            # Rows arrive best first, so this is the entity's best detail match
+            best_detail_score[entity_id] = row.score
+            result["score"] += DETAIL_SCORE_WEIGHT * row.score
+            result["snippet"] = result["snippet"] or _highlight(row.snippet)
+        if len(result["references"]) < MAX_REFERENCES_PER_ENTITY:
+            result["references"].append({
+                "episode_id": row.episode_id,
+                "episode_title": row.episode_title,
+                "timestamp_start": row.timestamp_start,
+                "timestamp_end": row.timestamp_end,
+                "detail_id": row.detail_id,
+                "snippet": _highlight(row.snippet)
+            })
+
+    ranked = sorted(results.values(), key=lambda result: result["score"])[:limit]
+    if not ranked:
+        return []
+
+    ids = ",".join(str(result["id"]) for result in ranked)
+    entities = {
+        row.id: row for row in db.execute(text(f"SELECT id, name, type, summary FROM entities WHERE id IN ({ids})"))
+    }
+    return [
+        {
+            "id": str(result["id"]),
+            "name": entities[result["id"]].name,
+            "type": entities[result["id"]].type,
+            "summary": entities[result["id"]].summary or "",
+            "snippet": result["snippet"],
+            "score": round(-result["score"], 4),
+            "references": result["references"]
+        }
+        for result in ranked if result["id"] in entities
+    ]
@@ -0,0 +1,80 @@
+"""
+Tests for silence trimming and mapping trimmed timestamps back to the original audio.
+Run with: python -m pytest test_audio_processor.py
+"""
+
+from pydub import AudioSegment
+from pydub.generators import Sine
+
+from audio_processor import SILENCE_PADDING_MS, trim_silence, remap_trimmed_time, offset_transcript_timestamps
+
+def make_audio(*parts):
+    """Build mono 16 kHz audio from ("tone" | "silence", milliseconds) parts."""
+    audio = AudioSegment.empty()
+    for kind, duration_ms in parts:
+        if kind == "tone":
+            audio += Sine(440).to_audio_segment(duration=duration_ms, volume=-6).set_channels(1).set_frame_rate(16000)
+        else:
+            audio += AudioSegment.silent(duration=duration_ms, frame_rate=16000)
+    return audio
+
+def remap_inverse(segments, original_s):
+    """Position in the trimmed audio of a moment in the original audio (test helper)."""
+    original_ms = original_s * 1000
+    for segment in segments:
+        if segment["original_start"] <= original_ms < segment["original_start"] + segment["duration"]:
+            return (segment["trimmed_start"] + original_ms - segment["original_start"]) / 1000
+    raise ValueError("moment was trimmed away")
+
+# Tones at 0-3 s, 13-17 s and 22-24 s of a 24 s chunk, separated by long silences
+SPEECH = [("tone", 3000), ("silence", 10000), ("tone", 4000), ("silence", 5000), ("tone", 2000)]
+TONE_STARTS_S = [0, 13, 22]
+
+# Silence detection works in 10 ms steps
+TOLERANCE_S = 0.02
+
+def test_trim_silence_keeps_padded_speech_ranges():
+    audio = make_audio(*SPEECH)
+    trimmed, segments = trim_silence(audio)
+
+    assert len(segments) == len(TONE_STARTS_S)
+    for segment, tone_start_s in zip(segments, TONE_STARTS_S):
+        expected_start_s = max(0, tone_start_s - SILENCE_PADDING_MS / 1000)
+        assert abs(segment["original_start"] / 1000 - expected_start_s) <= TOLERANCE_S
+    assert len(trimmed) == sum(segment["duration"] for segment in segments)
+    assert len(trimmed) < len(audio) - 10000
+
+def test_trimmed_timestamps_map_back_to_original_audio():
+    audio = make_audio(*SPEECH)
+    trimmed, segments = trim_silence(audio)
+
+    # A moment inside each kept range maps to the same moment in the original audio
+    for segment in segments:
+        for offset_ms in (0, segment["duration"] // 2):
+            trimmed_s = (segment["trimmed_start"] + offset_ms) / 1000
+            assert remap_trimmed_time(segments, trimmed_s) == (segment["original_start"] + offset_ms) / 1000
+
+    # 1 s into each tone of the trimmed audio is 1 s into the same tone of the original
+    for segment, tone_start_s in zip(segments, TONE_STARTS_S):
+        padding_ms = (tone_start_s * 1000) - segment["original_start"]
+        trimmed_s = (segment["trimmed_start"] + padding_ms + 1000) / 1000
+        assert abs(remap_trimmed_time(segments, trimmed_s) - (tone_start_s + 1)) <= TOLERANCE_S
+
+    # The remapped moment is audible in the original, not in a removed silence
+    original_ms = int(remap_trimmed_time(segments, (segments[1]["trimmed_start"] + 1000) / 1000) * 1000)
+    assert audio[original_ms:original_ms + 100].dBFS > -20
+
+    # Without a segment map (trimming disabled) times are unchanged
+    assert remap_trimmed_time(None, 42.5) == 42.5
+
+def test_transcript_timestamps_are_offset_onto_episode_timeline():
+    _, segments = trim_silence(make_audio(*SPEECH))
+
+    # The chunk starts 10 minutes into the episode; the third tone is 22 s into the chunk
+    # but, with the silences removed, only about 8 s into the trimmed audio the model hears
+    third_tone_trimmed_s = round(remap_inverse(segments, 22.5))
+    transcript = f"[00:00] Host: hello\n[00:{third_tone_trimmed_s:02d}] Guest: hi"
+
+    lines = offset_transcript_timestamps(transcript, 600, segments).splitlines()
+    assert lines[0] == "[0:10:00] Host: hello"
+    assert lines[1] == "[0:10:22] Guest: hi"
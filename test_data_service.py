@@ -0,0 +1,61 @@
+"""
+Tests for storing refined episode analyses and linking their entities.
+Run with: python -m pytest test_data_service.py
+"""
+
+from sqlalchemy import event
+
+from database import Detail, Entity, Relationship
+from data_service import DataService
+
+def test_relationship_without_description_is_stored(db):
+    data_service = DataService(db)
+    episode = data_service.create_episode("Interview")
+    data_service.process_refined_analysis(episode.id, {
+        "entities": [
+            {"name": "Ada Lovelace", "type": "Person"},
+            {"name": "Charles Babbage", "type": "Person"},
+        ],
+        "relationships": [
+            {"source": "Ada Lovelace", "target": "Charles Babbage"},
+            {"source": "Charles Babbage", "target": "Ada Lovelace", "description": None},
+        ],
+        "details": [{"entity": "Ada Lovelace", "detail": "Wrote the first published program."}],
+    })
+
+    assert [relationship.description for relationship in db.query(Relationship).all()] == ["", ""]
+    # The rest of the episode was written in the same transaction
+    assert db.query(Detail).count() == 1
+
+def insert_before_next_entity_insert(db, name, entity_type):
+    """Simulate another episode inserting an entity between our lookup and our insert."""
+    pending = [(name, entity_type)]
+
+    @event.listens_for(db.get_bind(), "before_cursor_execute")
+    def other_writer(conn, cursor, statement, parameters, context, executemany):
+        if pending and statement.startswith("INSERT INTO entities "):
+            cursor.execute("INSERT INTO entities (name, type) VALUES (?, ?)", pending.pop())
+
+def test_concurrent_insert_of_a_new_name_links_to_the_other_row(db):
+    data_service = DataService(db)
+    episode = data_service.create_episode("Interview")
+    insert_before_next_entity_insert(db, "Ada Lovelace", "Person")
+
+    data_service.process_refined_analysis(episode.id, {
+        "entities": [
+            {"name": "Ada Lovelace", "type": "Person", "summary": "Mathematician."},
+            {"name": "Charles Babbage", "type": "Person"},
+        ],
+        "relationships": [{"source": "Ada Lovelace", "target": "Charles Babbage", "description": "corresponded with"}],
+        "details": [],
+    })
+
+    assert sorted(name for name, in db.query(Entity.name)) == ["Ada Lovelace", "Charles Babbage"]
+    assert db.query(Relationship).count() == 1
+
+def test_get_or_create_entity_survives_a_concurrent_insert(db):
+    insert_before_next_entity_insert(db, "Ada Lovelace", "Person")
+    entity = DataService(db).get_or_create_entity("Ada Lovelace", "Person", "Mathematician.")
+
+    assert db.query(Entity).count() == 1
+    assert entity.summary == "Mathematician."
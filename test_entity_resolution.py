@@ -0,0 +1,143 @@
+"""
+Tests for entity name keys, duplicate merging before refinement and linking to stored entities.
+Run with: python -m pytest test_entity_resolution.py
+"""
+
+import pytest
+
+from database import Entity, Relationship
+from data_service import DataService
+from entity_resolution import dedupe_analysis, entity_index, entity_name_keys
+
+def entity_names(deduped):
+    return sorted(entity["name"] for entity in deduped["entities"])
+
+def test_parenthetical_acronym_is_matched_under_both_parts():
+    assert entity_name_keys("Central Intelligence Agency (CIA)") == [
+        "central intelligence agency cia", "central intelligence agency", "cia"
+    ]
+    assert entity_name_keys("CIA (Central Intelligence Agency)") == [
+        "cia central intelligence agency", "cia", "central intelligence agency"
+    ]
+
+    deduped, report = dedupe_analysis({
+        "entities": [
+            {"name": "Central Intelligence Agency (CIA)", "type": "Organization"},
+            {"name": "CIA", "type": "Organization"},
+            {"name": "Central Intelligence Agency", "type": "Organization"},
+        ],
+        "relationships": [{"source": "CIA", "target": "Central Intelligence Agency", "description": "same agency"}],
+        "details": [],
+    })
+    assert entity_names(deduped) == ["Central Intelligence Agency (CIA)"]
+    assert report["entities_removed"] == 2
+
+def test_parenthetical_disambiguator_is_not_an_alias():
+    assert entity_name_keys("Paris (Texas)") == ["paris texas"]
+    assert entity_name_keys("Mercury (planet)") == ["mercury planet"]
+
+    deduped, _ = dedupe_analysis({
+        "entities": [
+            {"name": "Paris (Texas)", "type": "Place"},
+            {"name": "Paris", "type": "Place"},
+            {"name": "Texas", "type": "Place"},
+        ],
+        "relationships": [],
+        "details": [],
+    })
+    assert entity_names(deduped) == ["Paris", "Paris (Texas)", "Texas"]
+
+def test_disambiguated_names_keep_their_relationship():
+    deduped, _ = dedupe_analysis({
+        "entities": [
+            {"name": "Mercury (planet)", "type": "Concept"},
+            {"name": "Mercury (element)", "type": "Concept"},
+            {"name": "Planet", "type": "Concept"},
+        ],
+        "relationships": [{"source": "Mercury (element)", "target": "Mercury (planet)", "description": "named after"}],
+        "details": [],
+    })
+    assert entity_names(deduped) == ["Mercury (element)", "Mercury (planet)", "Planet"]
+    relationship = deduped["relationships"][0]
+    assert (relationship["source"], relationship["target"]) == ("Mercury (element)", "Mercury (planet)")
+
+def link(db, *entities):
+    """Link (name, type) pairs through DataService.link_entities and commit; returns name -> entity id."""
+    linked, _ = DataService(db).link_entities(
+        {name: {"name": name, "type": entity_type, "summary": None} for name, entity_type in entities}
+    )
+    db.commit()
+    entity_index.sync(db)
+    return linked
+
+def test_index_lookup_is_blocked_on_type(db):
+    apple_id = link(db, ("Apple", "Organization"))["Apple"]
+
+    assert entity_index.lookup("apple", "Organization") == apple_id
+    assert entity_index.lookup("APPLE", "organization") == apple_id
+    assert entity_index.lookup("apple", "Concept") is None
+    # An untyped lookup falls back to the name alone
+    assert entity_index.lookup("apple") == apple_id
+
+    concept_id = link(db, ("apple", "Concept"))["apple"]
+    assert concept_id != apple_id
+    assert entity_index.lookup("Apple", "Concept") == concept_id
+    assert entity_index.lookup("Apple", "Organization") == apple_id
+
+def test_same_name_of_another_type_links_to_the_existing_row(db):
+    # Entity names are unique, so the exact name can only ever be the one row
+    mercury_id = link(db, ("Mercury", "Person"))["Mercury"]
+    assert link(db, ("Mercury", "Concept"))["Mercury"] == mercury_id
+
+@pytest.mark.parametrize("stored, other", [
+    ("Henry VIII", "Henry VII"),
+    ("Super Bowl LVII", "Super Bowl LVIII"),
+    ("Queen Elizabeth I", "Queen Elizabeth II"),
+    ("Robert F. Kennedy", "Robert F. Kennedy Jr."),
+])
+def test_names_differing_in_numbering_do_not_fuzzy_match(db, stored, other):
+    stored_id = link(db, (stored, "Person"))[stored]
+    assert entity_index.lookup(other, "Person") is None
+    assert link(db, (other, "Person"))[other] != stored_id
+
+def test_near_identical_spellings_still_fuzzy_match(db):
+    hitchens_id = link(db, ("Christopher Hitchens", "Person"))["Christopher Hitchens"]
+    assert entity_index.lookup("Christopher Hitchen", "Person") == hitchens_id
+    # Matching numbering doesn't block a fuzzy match
+    roosevelt_id = link(db, ("Franklin Delano Roosevelt Jr.", "Person"))["Franklin Delano Roosevelt Jr."]
+    assert entity_index.lookup("Franklin Delano Rosevelt Jr.", "Person") == roosevelt_id
+
+@pytest.mark.parametrize("names", [
+    ["Central Intelligence Agency", "CIA"],
+    ["CIA", "Central Intelligence Agency"],
+])
+def test_acronym_links_to_full_name_in_the_same_batch(db, names):
+    linked = link(db, *((name, "Organization") for name in names))
+    assert linked["CIA"] == linked["Central Intelligence Agency"]
+    assert db.query(Entity).count() == 1
+    # The acronym is kept as an alias, so later lookups find it exactly
+    assert entity_index.lookup("CIA", "Organization") == linked["CIA"]
+
+def test_fuzzy_spelling_links_within_the_same_batch(db):
+    linked = link(db, ("Christopher Hitchens", "Person"), ("Christopher Hitchen", "Person"), ("Henry VIII", "Person"), ("Henry VII", "Person"))
+    assert linked["Christopher Hitchens"] == linked["Christopher Hitchen"]
+    assert linked["Henry VIII"] != linked["Henry VII"]
+
+def test_relationships_between_spellings_of_one_entity_are_skipped(db):
+    data_service = DataService(db)
+    episode = data_service.create_episode("Spy stories")
+    data_service.process_refined_analysis(episode.id, {
+        "entities": [
+            {"name": "Central Intelligence Agency", "type": "Organization"},
+            {"name": "CIA", "type": "Organization"},
+            {"name": "Allen Dulles", "type": "Person"},
+        ],
+        "relationships": [
+            {"source": "CIA", "target": "Central Intelligence Agency", "description": "also known as"},
+            {"source": "Allen Dulles", "target": "CIA", "description": "directed"},
+        ],
+        "details": [],
+    })
+    relationships = db.query(Relationship).all()
+    assert [relationship.description for relationship in relationships] == ["directed"]
+    assert relationships[0].source_entity_id != relationships[0].target_entity_id
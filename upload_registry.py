@@ -0,0 +1,123 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+UPLOAD_REGISTRY_PATH = os.getenv("UPLOAD_REGISTRY_PATH", "./upload_registry.db")
+
+# Gemini keeps uploaded files for 48 hours
+UPLOAD_DEFAULT_TTL_S = 48 * 3600
+
+# Don't reuse an upload that expires within this window; a call may still be queued behind the rate limiter
+UPLOAD_REUSE_MARGIN_S = int(os.getenv("UPLOAD_REUSE_MARGIN_MINUTES", "60")) * 60
+
+# Remote files unused for this long are deleted by the sweeper before they expire
+UPLOAD_IDLE_TTL_S = int(os.getenv("UPLOAD_IDLE_TTL_HOURS", "24")) * 3600
+UPLOAD_SWEEP_INTERVAL_S = int(os.getenv("UPLOAD_SWEEP_INTERVAL_MINUTES", "30")) * 60
+
+class UploadRegistry:
+    """
+    Persistent map from chunk audio hash to the remote file it was uploaded as.
+    Lets identical audio be analyzed again (new prompt version, retries, resumed
+    runs) without uploading it again, and tracks which remote files are stale.
+    """
+
+    def __init__(self, path: str = UPLOAD_REGISTRY_PATH):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS uploaded_files (
+                audio_hash TEXT PRIMARY KEY,
+                remote_name TEXT NOT NULL,
+                uri TEXT NOT NULL,
+                mime_type TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self._conn.commit()
+
+    def get(self, audio_hash: str, margin_s: int = UPLOAD_REUSE_MARGIN_S) -> Optional[Dict[str, Any]]:
+        """Return the upload for this audio if it stays valid for at least margin_s, marking it used."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT remote_name, uri, mime_type, expires_at FROM uploaded_files WHERE audio_hash = ? AND expires_at > ?",
+                (audio_hash, now + margin_s)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE uploaded_files SET last_used = ? WHERE audio_hash = ?", (now, audio_hash))
+            self._conn.commit()
+        return {"name": row[0], "uri": row[1], "mime_type": row[2], "expires_at": row[3]}
+
+    def put(self, audio_hash: str, remote_name: str, uri: str, mime_type: str, expires_at: Optional[float] = None):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO uploaded_files VALUES (?, ?, ?, ?, ?, ?)",
+                (audio_hash, remote_name, uri, mime_type, expires_at or now + UPLOAD_DEFAULT_TTL_S, now)
+            )
+            self._conn.commit()
+
+    def remove(self, audio_hash: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM uploaded_files WHERE audio_hash = ?", (audio_hash,))
+            self._conn.commit()
+
+    def stale(self, idle_ttl_s: int = UPLOAD_IDLE_TTL_S) -> List[Dict[str, Any]]:
+        """Uploads that have expired or have not been used for idle_ttl_s."""
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT audio_hash, remote_name, expires_at FROM uploaded_files WHERE expires_at <= ? OR last_used <= ?",
+                (now, now - idle_ttl_s)
+            ).fetchall()
+        return [{"audio_hash": row[0], "name": row[1], "expired": row[2] <= now} for row in rows]
+
+    def sweep(self, delete_remote: Callable[[str], None], idle_ttl_s: int = UPLOAD_IDLE_TTL_S) -> int:
+        """
+        Delete stale remote files with delete_remote(name) and drop them from the registry.
+        Expired files are already gone remotely and are only dropped. Files that fail
+        to delete stay registered and are retried on the next sweep.
+        Returns the number removed.
+        """
+        removed = 0
+        for upload in self.stale(idle_ttl_s):
+            if not upload["expired"]:
+                try:
+                    delete_remote(upload["name"])
+                except Exception as e:
+                    print(f"Error deleting uploaded file {upload['name']}: {e}")
+                    continue
+            self.remove(upload["audio_hash"])
+            removed += 1
+        return removed
+
+class UploadSweeper:
+    """Background thread that periodically sweeps stale uploads from a registry."""
+
+    def __init__(self, registry: UploadRegistry, delete_remote: Callable[[str], None],
+                 interval_s: int = UPLOAD_SWEEP_INTERVAL_S):
+        self.registry = registry
+        self.delete_remote = delete_remote
+        self.interval_s = interval_s
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="upload-sweeper", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval_s):
+            try:
+                removed = self.registry.sweep(self.delete_remote)
+                if removed:
+                    print(f"Removed {removed} stale uploaded files")
+            except Exception as e:
+                print(f"Error sweeping uploaded files: {e}")